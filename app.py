@@ -1,20 +1,29 @@
 import streamlit as st
+import time
 import uuid
-from cog.agent import agent_runnable, get_session_history
-from langchain_core.messages import HumanMessage
+from cog.agent import FinalAnswer, TokenDelta, ToolEnd, ToolStart, agent_runnable, get_session_history
+from cog.config import Config
+from cog.memory import is_dialogue
 
 st.set_page_config(page_title="Personal Knowledge Manager", page_icon="📚", layout="wide")
 
 if "session_id" not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
+    # kept in the URL so a reload or a restart resumes the stored conversation
+    st.session_state.session_id = st.query_params.get("session") or str(uuid.uuid4())
+    st.query_params["session"] = st.session_state.session_id
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = [
+        {"role": "user" if m.type == "human" else "assistant", "content": m.content}
+        for m in get_session_history(st.session_state.session_id)
+        if is_dialogue(m)
+    ]
 
 with st.sidebar:
     st.title("📂 Personal Knowledge Manager")
     st.markdown("Your secure, offline assistant for local document management.")
     if st.button("🔄 New Chat"):
         st.session_state.session_id = str(uuid.uuid4())
+        st.query_params["session"] = st.session_state.session_id
         st.session_state.messages = []
         st.rerun()
 
@@ -23,6 +32,8 @@ st.header("💬 Chat with your documents")
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
+        if msg.get("metrics"):
+            st.caption(msg["metrics"])
 
 if prompt := st.chat_input("Ask about your documents..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -30,47 +41,45 @@ if prompt := st.chat_input("Ask about your documents..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
+        tools = st.container()
         placeholder = st.empty()
-        full_response = ""
+        parts: list[str] = []
+        statuses = {}
+        metrics = ""
+        last_render = 0.0
         try:
-            # Use our updated agent implementation
-            for chunk in agent_runnable["stream"](
-                prompt, 
-                session_id=st.session_state.session_id
-            ):
-                if "messages" in chunk:
-                    last = chunk["messages"][-1]
-                    # Handle different response formats safely
-                    if isinstance(last, dict):
-                        if "output" in last:
-                            # Handle dictionary with output field
-                            full_response += str(last["output"])
-                            placeholder.markdown(full_response + "▌")
-                        elif "tool" in last:
-                            # Handle tool execution
-                            placeholder.markdown(f"🔍 Searching your documents with `{last.get('tool', 'tool')}`...")
-                    else:
-                        # Try to get content from the message
-                        try:
-                            content = getattr(last, "content", None)
-                            if content and isinstance(content, str):
-                                full_response += content
-                                placeholder.markdown(full_response + "▌")
-                        except:
-                            # If anything fails, try to convert to string
-                            try:
-                                text = str(last)
-                                if text and text != "None":
-                                    full_response += text
-                                    placeholder.markdown(full_response + "▌")
-                            except:
-                                pass
-            
-            # Display final response
+            for event in agent_runnable["stream"](prompt, session_id=st.session_state.session_id):
+                if isinstance(event, TokenDelta):
+                    parts.append(event.text)
+                    # re-render at a bounded rate instead of once per token
+                    now = time.perf_counter()
+                    if now - last_render >= Config.App.RENDER_INTERVAL:
+                        placeholder.markdown("".join(parts) + "▌")
+                        last_render = now
+                elif isinstance(event, ToolStart):
+                    # text streamed before a tool call is the model thinking aloud
+                    parts.clear()
+                    placeholder.empty()
+                    statuses[event.run_id] = tools.status(f"🔍 Running `{event.name}`...")
+                    statuses[event.run_id].write(event.args)
+                elif isinstance(event, ToolEnd):
+                    status = statuses.pop(event.run_id, None)
+                    if status is not None:
+                        status.update(label=f"✅ `{event.name}` ({event.seconds:.1f}s)", state="complete")
+                elif isinstance(event, FinalAnswer):
+                    parts = [event.text]
+                    if event.time_to_first_token is not None:
+                        metrics = (
+                            f"⏱️ {event.time_to_first_token:.2f}s to first token · "
+                            f"{event.tokens_per_second:.1f} tok/s"
+                        )
+            full_response = "".join(parts)
             placeholder.markdown(full_response)
+            if metrics:
+                st.caption(metrics)
         except Exception as e:
             placeholder.error(f"❌ Error: {e}")
             full_response = f"Error: {e}"
-        
+
         # Save the message to history
-        st.session_state.messages.append({"role": "assistant", "content": full_response})
+        st.session_state.messages.append({"role": "assistant", "content": full_response, "metrics": metrics})
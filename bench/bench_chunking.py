@@ -0,0 +1,110 @@
+"""
+Embedding calls and wall time per chunking strategy.
+
+Each strategy chunks and embeds the same synthetic Markdown/Python corpus
+with an in-process embedder that charges a fixed latency per request and per
+text. "legacy" is the previous pipeline: langchain's SemanticChunker followed
+by a second embedding pass over the chunks.
+
+    python -m bench.bench_chunking --files 40
+"""
+import argparse
+import random
+import time
+
+from langchain_core.embeddings import Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+
+from bench.mock_ollama import fake_embedding
+from cog.chunking import RecursiveStrategy, SemanticStrategy, StructureStrategy
+
+
+class CountingEmbeddings(Embeddings):
+    model = "bench"
+
+    def __init__(self, dim: int, request_latency: float, item_latency: float):
+        self.dim = dim
+        self.request_latency = request_latency
+        self.item_latency = item_latency
+        self.calls = 0
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.request_latency + self.item_latency * len(texts))
+        return [fake_embedding(text, self.dim) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_corpus(files: int, seed: int = 0) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(300)]
+
+    def sentence() -> str:
+        return " ".join(rng.choices(words, k=rng.randint(6, 18))).capitalize() + "."
+
+    corpus = []
+    for i in range(files):
+        if i % 2:
+            body = "\n\n".join(
+                f"{'#' * rng.randint(1, 3)} Section {j}\n\n" + " ".join(sentence() for _ in range(rng.randint(3, 15)))
+                for j in range(rng.randint(3, 10))
+            )
+            corpus.append((body, ".md"))
+        else:
+            body = "\n\n".join(
+                f"def function_{j}(value):\n    \"\"\"{sentence()}\"\"\"\n    return value * {j}\n"
+                for j in range(rng.randint(5, 30))
+            )
+            corpus.append((body, ".py"))
+    return corpus
+
+
+def run_strategy(strategy, embedder: CountingEmbeddings, corpus) -> int:
+    chunks = [chunk for text, suffix in corpus for chunk in strategy.chunk(text, suffix)]
+    pending = [chunk.text for chunk in chunks if chunk.vector is None]
+    if pending:
+        embedder.embed_documents(pending)
+    return len(chunks)
+
+
+def run_legacy(embedder: CountingEmbeddings, corpus) -> int:
+    splitter = SemanticChunker(
+        embeddings=embedder, breakpoint_threshold_type="percentile", breakpoint_threshold_amount=95
+    )
+    chunks = [chunk for text, _ in corpus for chunk in splitter.split_text(text)]
+    embedder.embed_documents(chunks)
+    return len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--item-latency", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.files)
+    print(f"{'strategy':<10} {'chunks':>7} {'calls':>6} {'texts':>7} {'seconds':>8}")
+    for name in ("legacy", "recursive", "structure", "semantic"):
+        embedder = CountingEmbeddings(args.dim, args.request_latency, args.item_latency)
+        start = time.perf_counter()
+        if name == "legacy":
+            chunks = run_legacy(embedder, corpus)
+        else:
+            strategy = {
+                "recursive": RecursiveStrategy,
+                "structure": StructureStrategy,
+                "semantic": lambda: SemanticStrategy(embedder),
+            }[name]()
+            chunks = run_strategy(strategy, embedder, corpus)
+        seconds = time.perf_counter() - start
+        print(f"{name:<10} {chunks:>7} {embedder.calls:>6} {embedder.texts:>7} {seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput of RemoteOllamaEmbeddings against a local stub server.
+
+Compares the pooled, batched client with the previous one-`requests.post`-per-call
+implementation, for many single queries and for one large corpus.
+
+    python -m bench.bench_embedder --texts 2000 --queries 200
+"""
+import argparse
+import time
+
+import requests
+
+from bench.mock_ollama import serve
+from cog.remote_embedder import RemoteOllamaEmbeddings
+
+
+class LegacyEmbeddings:
+    """The client as it was before pooling: one unbounded request per call."""
+
+    def __init__(self, endpoint: str, model: str):
+        self.endpoint = endpoint
+        self.model = model
+
+    def embed_documents(self, texts):
+        response = requests.post(
+            f"{self.endpoint}/api/embeddings",
+            json={"model": self.model, "input": texts}
+        )
+        response.raise_for_status()
+        return response.json()["data"]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--connect-latency", type=float, default=0.005)
+    parser.add_argument("--per-item-latency", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    corpus = [f"document number {i} about topic {i % 17}" for i in range(args.texts)]
+    queries = [f"question {i}" for i in range(args.queries)]
+
+    with serve(connect_latency=args.connect_latency, per_item_latency=args.per_item_latency) as server:
+        clients = {
+            "legacy": LegacyEmbeddings(server.url, "bench"),
+            "pooled": RemoteOllamaEmbeddings(
+                server.url, "bench", batch_size=args.batch_size, max_workers=args.workers
+            ),
+        }
+        print(f"{'client':<8} {'scenario':<8} {'seconds':>8} {'items/s':>10} {'connections':>12}")
+        for name, client in clients.items():
+            for scenario, items, run in (
+                ("queries", len(queries), lambda: [client.embed_query(q) for q in queries]),
+                ("corpus", len(corpus), lambda: client.embed_documents(corpus)),
+            ):
+                connections = server.connections
+                seconds = timed(run)
+                print(
+                    f"{name:<8} {scenario:<8} {seconds:>8.3f} {items / seconds:>10.1f}"
+                    f" {server.connections - connections:>12}"
+                )
+
+
+if __name__ == "__main__":
+    main()
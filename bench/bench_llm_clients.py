@@ -0,0 +1,83 @@
+"""
+Chat client reuse and model warm-up against the mock Ollama server.
+
+"per-call" builds a fresh ChatOllama for every request, as the code did before
+the client registry; "registry" goes through `create_llm`, which shares one
+client and a pooled transport per configuration. Both runs report the number
+of TCP connections opened and the request latency. The warm-up run compares
+the first request on a cold server with and without `warm_up` at startup.
+
+    python -m bench.bench_llm_clients --requests 50 --concurrency 4
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import replace
+
+from langchain_ollama import ChatOllama
+
+from bench.bench_tools_load import percentile
+from bench.mock_ollama import serve
+from cog.config import QWEN25_14B
+from cog.models import create_llm, warm_up
+
+PROMPT = "Summarize the quarterly report in two sentences."
+
+
+async def run(make_llm, requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await make_llm().ainvoke(PROMPT)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--connect-latency", type=float, default=0.02)
+    parser.add_argument("--request-latency", type=float, default=0.01)
+    parser.add_argument("--load-latency", type=float, default=1.0)
+    args = parser.parse_args()
+    latency = dict(connect_latency=args.connect_latency, request_latency=args.request_latency)
+
+    print(f"{'client':<10} {'conns':>6} {'p50 ms':>8} {'p99 ms':>8} {'seconds':>8}")
+    for name in ("per-call", "registry"):
+        # cache=False: every request has to reach the server, and nothing is written to CACHE_DIR
+        with serve(**latency) as server:
+            config = replace(QWEN25_14B, base_url=server.url, max_concurrency=args.concurrency, cache=False)
+            if name == "per-call":
+                def make_llm():
+                    return ChatOllama(model=config.name, temperature=config.temperature, base_url=config.base_url)
+            else:
+                def make_llm():
+                    return create_llm(config)
+            start = time.perf_counter()
+            latencies = asyncio.run(run(make_llm, args.requests, args.concurrency))
+            seconds = time.perf_counter() - start
+            print(
+                f"{name:<10} {server.connections:>6} {percentile(latencies, 50):>8.1f}"
+                f" {percentile(latencies, 99):>8.1f} {seconds:>8.3f}"
+            )
+
+    print(f"\n{'startup':<10} {'loads':>6} {'first request ms':>17}")
+    for name in ("cold", "warm-up"):
+        with serve(load_latency=args.load_latency, **latency) as server:
+            config = replace(QWEN25_14B, base_url=server.url, max_concurrency=args.concurrency, cache=False)
+            if name == "warm-up":
+                warm_up(config)
+            start = time.perf_counter()
+            create_llm(config).invoke(PROMPT)
+            first = time.perf_counter() - start
+            print(f"{name:<10} {server.loads:>6} {first * 1000:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
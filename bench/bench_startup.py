@@ -0,0 +1,82 @@
+"""
+Cold-start cost of the server and agent modules.
+
+For each module, runs a fresh interpreter with `-X importtime` and reports
+the total import time and the heaviest imports. It then measures
+time-to-first-tool-response: process start until a `list_files` call through
+FastMCP returns.
+
+    python -m bench.bench_startup --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+FIRST_TOOL_CALL = """
+import asyncio, time
+start = time.perf_counter()
+import server
+asyncio.run(server.mcp.call_tool("list_files", {"limit": 10}))
+print(time.perf_counter() - start)
+"""
+
+
+def import_times(module: str) -> list[tuple[int, int, str]]:
+    """`(self_us, cumulative_us, name)` for every import made by `import module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(own), int(cumulative), name.rstrip()))
+    return rows
+
+
+def depth(name: str) -> int:
+    """Nesting level of an -X importtime entry (0 for the module itself)."""
+    return (len(name) - len(name.lstrip()) - 1) // 2
+
+
+def first_tool_response() -> tuple[float, float]:
+    """Seconds from process spawn, and from `import server`, to the first tool result."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", FIRST_TOOL_CALL], capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", nargs="+", default=["server", "cog.agent"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        totals = [next(cum for _, cum, name in reversed(rows) if name.strip() == module) for rows in runs]
+        print(f"import {module}: median {statistics.median(totals) / 1000:.1f} ms over {args.repeat} runs")
+        # direct children of the top-level import, heaviest first
+        heaviest = sorted(
+            ((cum, name.strip()) for _, cum, name in runs[-1] if depth(name) == 1),
+            reverse=True,
+        )
+        for cumulative, name in heaviest[:args.top]:
+            print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+
+    spawn, after_import = zip(*(first_tool_response() for _ in range(args.repeat)))
+    print(
+        f"first list_files response: median {statistics.median(spawn) * 1000:.0f} ms from spawn,"
+        f" {statistics.median(after_import) * 1000:.0f} ms from `import server`"
+    )
+
+
+if __name__ == "__main__":
+    main()
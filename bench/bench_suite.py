@@ -0,0 +1,234 @@
+"""
+Offline benchmark suite: every scenario against the mock Ollama server.
+
+Generates a synthetic corpus (bench.corpus), starts the mock Ollama server
+(bench.mock_ollama) and runs each scenario in a fresh interpreter with its own
+cache directory, so scenarios neither share warm caches nor each other's peak
+RSS. A scenario does `--warmup` untimed requests (building the index for
+search), then `--requests` timed ones, `--concurrency` at a time. Results
+(throughput, p50/p95/p99 latency, peak RSS) are written as JSON; pass an
+earlier file to `--compare` to print the change per metric, and the exit
+status is 1 when any metric regressed by more than `--tolerance`.
+
+    python -m bench.bench_suite --output baseline.json
+    python -m bench.bench_suite --output current.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.bench_tools_load import free_port, percentile, start_mock
+from bench.corpus import DEFAULT_MIX, VOCABULARY, parse_mix, write_corpus
+
+SCENARIOS = ("list_files", "search", "read_file", "summarize_file", "agent")
+# metric -> True when higher is better
+METRICS = {"throughput": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "peak_rss_mb": False}
+
+
+def tool_requests(name: str, paths: list[str], rng: random.Random):
+    """Arguments for the i-th call of a tool scenario."""
+    if name == "list_files":
+        return lambda i: {"offset": rng.randrange(0, max(1, len(paths) - 50)), "limit": 50}
+    if name == "search":
+        return lambda i: {"query": " ".join(rng.choices(VOCABULARY, k=3))}
+    if name == "read_file":
+        return lambda i: {"path": rng.choice(paths), "length": 16 * 1024}
+    # files in turn, so each request summarizes a file that is not cached yet
+    return lambda i: {"file_path": paths[i % len(paths)]}
+
+
+async def run_scenario(name: str, paths: list[str], requests: int, concurrency: int, warmup: int) -> dict:
+    """Timed run of one scenario in this process."""
+    rng = random.Random(0)
+    if name == "agent":
+        from cog import agent
+
+        async def call(i: int):
+            # the mock answers `call:name{...}` with that tool call, then with a final answer
+            prompt = f'Summarize this file. call:read_file{{"path": "{rng.choice(paths)}"}}'
+            await asyncio.to_thread(agent.invoke, prompt, f"bench-{i}")
+    else:
+        import server
+
+        arguments = tool_requests(name, paths, rng)
+
+        async def call(i: int):
+            await server.mcp.call_tool(name, arguments(i))
+
+    setup_start = time.perf_counter()
+    for i in range(warmup):
+        await call(requests + i)
+    setup = time.perf_counter() - setup_start
+
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "setup_seconds": round(setup, 3),
+        "seconds": round(elapsed, 3),
+        "throughput": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        # kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def worker(args):
+    """Entry point of the per-scenario interpreter; prints the result as one JSON line."""
+    data_dir = Path(os.environ["APP_HOME"]) / "data"
+    paths = sorted(path.relative_to(data_dir).as_posix() for path in data_dir.rglob("*") if path.is_file())
+    result = asyncio.run(run_scenario(args.scenario, paths, args.requests, args.concurrency, args.warmup))
+    print(json.dumps(result), flush=True)
+
+
+def run_suite(args) -> dict:
+    port = free_port()
+    mock = start_mock(
+        port, dim=args.dim, request_latency=args.request_latency,
+        per_item_latency=args.per_item_latency, token_latency=args.token_latency,
+    )
+    scenarios = {}
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            write_corpus(Path(home) / "data", args.files, args.mix, args.words, args.seed)
+            for name in args.scenarios:
+                env = {
+                    **os.environ,
+                    "APP_HOME": home,
+                    "CACHE_DIR": str(Path(home) / f"cache-{name}"),
+                    "OLLAMA_BASE_URL": f"http://127.0.0.1:{port}",
+                    "OLLAMA_EMBED_ENDPOINT": f"http://127.0.0.1:{port}",
+                    # measure the model round trips, not the response cache
+                    "RESPONSE_CACHE": "0",
+                }
+                env.pop("MCP_URL", None)
+                result = subprocess.run(
+                    [
+                        sys.executable, "-m", "bench.bench_suite", "--worker", "--scenario", name,
+                        "--requests", str(args.requests if name != "agent" else args.agent_requests),
+                        "--concurrency", str(args.concurrency), "--warmup", str(args.warmup),
+                    ],
+                    env=env, capture_output=True, text=True,
+                )
+                if result.returncode:
+                    print(result.stderr, file=sys.stderr)
+                    raise RuntimeError(f"scenario {name} failed")
+                scenarios[name] = json.loads(result.stdout.strip().splitlines()[-1])
+                print(f"{name:<16} {format_result(scenarios[name])}", file=sys.stderr)
+    finally:
+        mock.kill()
+    return {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "files": args.files, "mix": args.mix, "words": args.words, "seed": args.seed,
+            "requests": args.requests, "agent_requests": args.agent_requests,
+            "concurrency": args.concurrency, "warmup": args.warmup, "dim": args.dim,
+            "request_latency": args.request_latency, "per_item_latency": args.per_item_latency,
+            "token_latency": args.token_latency,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_result(result: dict) -> str:
+    return (
+        f"{result['throughput']:>8.1f}/s  p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms"
+        f"  p99 {result['p99_ms']:>8.1f} ms  rss {result['peak_rss_mb']:>7.1f} MB  errors {result['errors']}"
+    )
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """Print the relative change of every metric; returns the regressions beyond `tolerance`."""
+    if baseline.get("settings") != current.get("settings"):
+        print("warning: the runs used different settings", file=sys.stderr)
+    print(f"\n{baseline.get('commit')} -> {current.get('commit')}")
+    print(f"{'scenario':<16} " + " ".join(f"{metric:>14}" for metric in METRICS))
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        cells = []
+        for metric, higher_is_better in METRICS.items():
+            change = (result[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(f"{name}.{metric}")
+            cells.append(f"{change:>+13.1%}{'!' if worse > tolerance else ' '}")
+        print(f"{name:<16} " + " ".join(cells))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--agent-requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--per-item-latency", type=float, default=0.0005)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--output", type=Path, default=Path("bench-results.json"))
+    parser.add_argument("--compare", type=Path, help="an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        sys.exit()
+    results = run_suite(args)
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Wrote {args.output}", file=sys.stderr)
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), results, args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
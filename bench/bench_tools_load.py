@@ -0,0 +1,123 @@
+"""
+Latency of the MCP tools under many concurrent clients.
+
+Starts the mock Ollama server in a subprocess, points the server at it and at
+a temporary data directory, then has `--clients` coroutines call the tools
+through FastMCP. A heartbeat task measures event-loop lag, which stays near
+zero only if slow tools do not block the loop.
+
+    python -m bench.bench_tools_load --clients 32 --calls 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+from bench.corpus import write_corpus
+
+TOOLS = ("search", "list_files", "read_file", "summarize_file")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(port: int, **latency: float) -> subprocess.Popen:
+    args = [sys.executable, "-m", "bench.mock_ollama", "--port", str(port)]
+    for name, value in latency.items():
+        args += [f"--{name.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=0.1)
+        except urllib.error.HTTPError:
+            return process  # the server is up; it just has no GET routes
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("mock Ollama server did not start")
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+
+async def main(args, files: list[str]):
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    requests = {
+        "search": lambda: {"query": f"word{random.randrange(500)}"},
+        "list_files": lambda: {"limit": 20},
+        "read_file": lambda: {"path": random.choice(files)},
+        "summarize_file": lambda: {"file_path": random.choice(files)},
+    }
+    latencies: dict[str, list[float]] = {tool: [] for tool in TOOLS}
+    lag: list[float] = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag.append(time.perf_counter() - start - 0.01)
+
+    async def client(i: int):
+        rng = random.Random(i)
+        for _ in range(args.calls):
+            tool = rng.choice(TOOLS)
+            start = time.perf_counter()
+            await server.mcp.call_tool(tool, requests[tool]())
+            latencies[tool].append(time.perf_counter() - start)
+
+    # build the index once so that the run measures queries, not indexing
+    await server.search("warm up")
+    probe = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe
+
+    print(f"{args.clients} clients x {args.calls} calls in {elapsed:.2f}s")
+    print(f"{'tool':<16} {'calls':>6} {'p50 ms':>9} {'p99 ms':>9}")
+    for tool, values in latencies.items():
+        print(f"{tool:<16} {len(values):>6} {percentile(values, 50):>9.1f} {percentile(values, 99):>9.1f}")
+    print(f"{'loop lag':<16} {len(lag):>6} {percentile(lag, 50):>9.1f} {percentile(lag, 99):>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    port = free_port()
+    mock = start_mock(port, request_latency=args.request_latency, token_latency=args.token_latency)
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            files = write_corpus(Path(home) / "data", args.files, mix={".md": 1})
+            os.environ["APP_HOME"] = home
+            os.environ["CACHE_DIR"] = str(Path(home) / ".cache")
+            # measure the model round trips, not the response cache
+            os.environ["RESPONSE_CACHE"] = "0"
+            os.environ["OLLAMA_EMBED_ENDPOINT"] = os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{port}"
+            asyncio.run(main(args, files))
+    finally:
+        mock.kill()
@@ -0,0 +1,112 @@
+"""
+Memory, latency and recall of the shared vector store per storage format.
+
+Writes `--rows` random `--dim`-dimensional vectors as one store per format,
+then starts `--workers` processes that each map the store and answer
+`--queries` top-k queries. Each worker reports its private and proportional
+(PSS, shared pages split between the processes mapping them) memory from
+/proc, its query latency and its recall against exact float32 scoring. The
+"in-memory" row is the previous layout: every worker holding its own
+float32 matrix.
+
+    python -m bench.bench_vector_store --rows 100000 --dim 1024 --workers 4
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench.bench_tools_load import percentile
+from cog.scoring import VectorScorer, normalize_rows
+from cog.vector_store import VectorStore, write_store
+
+FORMATS = ("in-memory", "float32", "float16", "int8")
+
+
+def memory_kb() -> dict[str, int]:
+    """Private and proportional set size of this process, from smaps_rollup."""
+    fields = {}
+    for line in Path("/proc/self/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        fields[name] = int(value.split()[0])
+    return {"private": fields["Private_Clean"] + fields["Private_Dirty"], "pss": fields["Pss"]}
+
+
+def worker(path: str, fmt: str, queries: np.ndarray, exact: list[set[int]], k: int, ready, start, results):
+    baseline = memory_kb()
+    if fmt == "in-memory":
+        store = VectorStore(Path(path))
+        scorer = VectorScorer(np.array(store.vectors))
+        del store
+    else:
+        scorer = VectorStore(Path(path)).scorer()
+    ready.wait()
+    start.wait()
+    latencies, hits = [], 0
+    for query, expected in zip(queries, exact):
+        begin = time.perf_counter()
+        rows, _ = scorer.top_k(query, k)
+        latencies.append(time.perf_counter() - begin)
+        hits += len(expected & set(rows.tolist()))
+    memory = memory_kb()
+    results.put({
+        "private_mb": (memory["private"] - baseline["private"]) / 1024,
+        "pss_mb": (memory["pss"] - baseline["pss"]) / 1024,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "recall": hits / (len(queries) * k),
+    })
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.rows, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    exact_scorer = VectorScorer(normalize_rows(vectors.copy()), faiss_threshold=0)
+    exact = [set(exact_scorer.top_k(query, args.k)[0].tolist()) for query in queries]
+    del exact_scorer
+
+    def blocks():
+        for i in range(0, args.rows, 8192):
+            block = vectors[i:i + 8192]
+            yield list(range(i, i + len(block))), ["doc.md"] * len(block), [""] * len(block), block
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.rows} x {args.dim}, {args.workers} workers, top {args.k}")
+    print(f"{'format':<10} {'file MB':>8} {'private MB':>11} {'PSS MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in FORMATS:
+            path = Path(tmp) / f"{fmt}.store"
+            write_store(path, blocks(), args.rows, args.dim, dtype="float32" if fmt == "in-memory" else fmt)
+            ready = context.Barrier(args.workers + 1)
+            start = context.Barrier(args.workers + 1)
+            results = context.Queue()
+            processes = [
+                context.Process(target=worker, args=(str(path), fmt, queries, exact, args.k, ready, start, results))
+                for _ in range(args.workers)
+            ]
+            for process in processes:
+                process.start()
+            ready.wait()
+            start.wait()
+            rows = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            mean = {key: sum(row[key] for row in rows) / len(rows) for key in rows[0]}
+            print(
+                f"{fmt:<10} {path.stat().st_size / 2**20:>8.1f} {mean['private_mb']:>11.1f} {mean['pss_mb']:>8.1f}"
+                f" {mean['p50_ms']:>8.2f} {mean['p99_ms']:>8.2f} {mean['recall']:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    main(parser.parse_args())
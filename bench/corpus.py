@@ -0,0 +1,139 @@
+"""
+Synthetic corpora for benchmarks.
+
+Writes `--files` documents into a data directory, the formats drawn from
+`--mix` (suffix=weight pairs) and the text from a fixed vocabulary, so the
+same seed always produces byte-identical files and comparable runs.
+
+    python -m bench.corpus /tmp/corpus/data --files 500 --mix md=4,txt=2,py=2,json=1,jsonl=1,pdf=1
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+
+DEFAULT_MIX = {".md": 4, ".txt": 2, ".py": 2, ".json": 1, ".jsonl": 1, ".pdf": 1}
+VOCABULARY = [f"word{i}" for i in range(500)]
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """`"md=4,pdf=1"` -> `{".md": 4.0, ".pdf": 1.0}`."""
+    mix = {}
+    for item in value.split(","):
+        suffix, _, weight = item.partition("=")
+        mix[suffix if suffix.startswith(".") else f".{suffix}"] = float(weight or 1)
+    return mix
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choices(VOCABULARY, k=words)) + "."
+
+
+def paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(sentence(rng) for _ in range(max(1, words // 12)))
+
+
+def minimal_pdf(pages: list[str]) -> bytes:
+    """A valid PDF with one line of Helvetica text per page, readable by pdfium."""
+    count = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(f"{4 + 2 * i} 0 R".encode() for i in range(count))
+        + f"] /Count {count} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def markdown(rng: random.Random, words: int) -> str:
+    sections = max(1, words // 200)
+    return "\n\n".join(
+        f"## Section {i}\n\n{paragraph(rng, words // sections)} See [the notes](notes/{i}.md)."
+        for i in range(sections)
+    )
+
+
+def python(rng: random.Random, words: int) -> str:
+    functions = max(1, words // 60)
+    return "\n\n".join(
+        f"def {rng.choice(VOCABULARY)}_{i}(value):\n    \"\"\"{sentence(rng)}\"\"\"\n"
+        + "".join(f"    # {sentence(rng)}\n" for _ in range(3))
+        + f"    return value + {i}\n"
+        for i in range(functions)
+    )
+
+
+def record(rng: random.Random, i: int) -> dict:
+    return {"id": i, "title": sentence(rng, 4), "tags": rng.choices(VOCABULARY, k=3), "body": {"text": sentence(rng)}}
+
+
+def render(suffix: str, rng: random.Random, words: int) -> str | bytes:
+    if suffix == ".md":
+        return markdown(rng, words)
+    if suffix == ".py":
+        return python(rng, words)
+    if suffix == ".json":
+        return json.dumps([record(rng, i) for i in range(max(1, words // 20))], indent=2)
+    if suffix == ".jsonl":
+        return "\n".join(json.dumps(record(rng, i)) for i in range(max(1, words // 20)))
+    if suffix == ".pdf":
+        return minimal_pdf([sentence(rng, 20) for _ in range(max(1, words // 20))])
+    return paragraph(rng, words)
+
+
+def write_corpus(
+    data_dir: Path,
+    files: int,
+    mix: dict[str, float] = DEFAULT_MIX,
+    words: int = 400,
+    seed: int = 0,
+) -> list[str]:
+    """
+    Write `files` documents of about `words` words each (sizes vary 0.25-4x)
+    into `data_dir`, spread over a few subdirectories; returns their relative
+    paths.
+    """
+    rng = random.Random(seed)
+    suffixes, weights = zip(*mix.items())
+    paths = []
+    for i in range(files):
+        suffix = rng.choices(suffixes, weights)[0]
+        relpath = Path(f"dir{i % 8}") / f"doc{i:05d}{suffix}"
+        content = render(suffix, rng, int(words * rng.uniform(0.25, 4)))
+        (data_dir / relpath).parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, bytes):
+            (data_dir / relpath).write_bytes(content)
+        else:
+            (data_dir / relpath).write_text(content)
+        paths.append(relpath.as_posix())
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.data_dir.mkdir(parents=True, exist_ok=True)
+    paths = write_corpus(args.data_dir, args.files, args.mix, args.words, args.seed)
+    print(f"Wrote {len(paths)} files to {args.data_dir}")
@@ -0,0 +1,203 @@
+"""Deterministic local stand-in for the Ollama HTTP API, for benchmarks."""
+import argparse
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """Stable pseudo-random unit vector derived from the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def keep_alive_seconds(value) -> float:
+    """Ollama's keep_alive: seconds, or a duration like "30m"; negative keeps the model forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        unit = next((u for u in ("ms", "s", "m", "h") if value.endswith(u)), "")
+        seconds = float(value[:-len(unit)] if unit else value) * units.get(unit, 1)
+    return float("inf") if seconds < 0 else seconds
+
+
+# `call:read_file{"path": "a.md"}` in the latest user message asks the mock for that tool call
+TOOL_DIRECTIVE = re.compile(r"call:(\w+)(\{.*?\})")
+
+
+def fake_tool_calls(request: dict) -> list[dict]:
+    """Tool calls requested by the latest user message, unless they were already answered."""
+    messages = request.get("messages", [])
+    if not request.get("tools") or not messages or messages[-1].get("role") != "user":
+        return []
+    offered = {tool["function"]["name"] for tool in request["tools"]}
+    return [
+        {"function": {"name": name, "arguments": json.loads(arguments)}}
+        for name, arguments in TOOL_DIRECTIVE.findall(str(messages[-1].get("content", "")))
+        if name in offered
+    ]
+
+
+def fake_reply(prompt: str) -> str:
+    words = prompt.split()
+    return f"This text has {len(words)} words and starts with {' '.join(words[:5])!r}."
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients can reuse sockets
+    server: "MockOllamaServer"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # every new connection pays the handshake cost once
+        time.sleep(self.server.connect_latency)
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_stream(self, parts: list[dict], interval: float = 0.0):
+        """Send NDJSON lines as HTTP chunks, `interval` seconds apart."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, part in enumerate(parts):
+            if i:
+                time.sleep(interval)
+            line = json.dumps(part).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _generate(self, request: dict, prompt: str, message: bool):
+        """Answer a chat/generate call, streamed as NDJSON unless `stream` is false."""
+        tool_calls = fake_tool_calls(request) if message else []
+        tokens = fake_reply(prompt).split(" ") if prompt and not tool_calls else []
+        self.server.load(request.get("model", ""), request.get("keep_alive"))
+        time.sleep(self.server.request_latency)
+        base = {"model": request.get("model", ""), "created_at": "2025-01-01T00:00:00Z"}
+
+        def part(text: str, done: bool) -> dict:
+            content = {"message": {"role": "assistant", "content": text}} if message else {"response": text}
+            extra = {"done_reason": "stop", "prompt_eval_count": len(prompt.split()), "eval_count": len(tokens)} if done else {}
+            if done and tool_calls:
+                content["message"]["tool_calls"] = tool_calls
+            return {**base, **content, "done": done, **extra}
+
+        if request.get("stream", True):
+            self._reply_stream([part(t + " ", False) for t in tokens] + [part("", True)], self.server.token_latency)
+        else:
+            time.sleep(self.server.token_latency * len(tokens))
+            self._reply(200, part(" ".join(tokens), True))
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests += 1
+        if self.path == "/api/embeddings":
+            texts = request.get("input") or [request.get("prompt", "")]
+            time.sleep(self.server.request_latency + self.server.per_item_latency * len(texts))
+            self._reply(200, {"data": [fake_embedding(t, self.server.dim) for t in texts]})
+        elif self.path == "/api/chat":
+            prompt = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+            self._generate(request, prompt, message=True)
+        elif self.path == "/api/generate":
+            self._generate(request, request.get("prompt", ""), message=False)
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        dim: int = 1024,
+        connect_latency: float = 0.0,
+        request_latency: float = 0.0,
+        per_item_latency: float = 0.0,
+        token_latency: float = 0.0,
+        load_latency: float = 0.0,
+    ):
+        super().__init__(("127.0.0.1", port), MockOllamaHandler)
+        self.dim = dim
+        self.connect_latency = connect_latency
+        self.request_latency = request_latency
+        self.per_item_latency = per_item_latency
+        self.token_latency = token_latency
+        self.load_latency = load_latency
+        self.connections = 0
+        self.requests = 0
+        self.loads = 0
+        # model -> monotonic time at which it gets unloaded
+        self._loaded: dict[str, float] = {}
+        self._load_lock = threading.Lock()
+
+    def load(self, model: str, keep_alive):
+        """Charge `load_latency` unless the model is still resident, then extend its residency."""
+        with self._load_lock:
+            if self._loaded.get(model, 0.0) <= time.monotonic():
+                time.sleep(self.load_latency)
+                self.loads += 1
+            self._loaded[model] = time.monotonic() + keep_alive_seconds(keep_alive)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+@contextmanager
+def serve(**kwargs):
+    """Run a MockOllamaServer on a free port in a background thread."""
+    server = MockOllamaServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock Ollama server in the foreground.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--connect-latency", type=float, default=0.0)
+    parser.add_argument("--request-latency", type=float, default=0.0)
+    parser.add_argument("--per-item-latency", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--load-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = MockOllamaServer(
+        port=args.port, dim=args.dim, connect_latency=args.connect_latency,
+        request_latency=args.request_latency, per_item_latency=args.per_item_latency,
+        token_latency=args.token_latency, load_latency=args.load_latency,
+    )
+    print(f"Mock Ollama listening on {server.url}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,33 @@
-import operator
 import asyncio
-from typing import TypedDict, Annotated, Sequence, Dict, Any, List, Optional
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langchain.agents import create_openai_tools_agent, AgentExecutor
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+import json
+import time
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from cog.concurrency import BackgroundLoop, cached_factory
+from cog.config import Config
 from cog.models import create_llm
-from cog.config import QWEN25_14B
-from cog.models import Config
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from cog.tool_session import MCPToolSession, connection
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import BaseMessage
+    from langchain_core.runnables import RunnableConfig
+    from langgraph.graph.state import CompiledStateGraph
+
+    from cog.memory import ContextBuilder, SessionStore
 
 # System prompt that describes the agent's capabilities and tools
 SYSTEM_PROMPT = """You are a Personal Knowledge Manager assistant that helps users find, summarize, and analyze information from their local document collection.
 You have access to the following tools to help users interact with their documents:
-1. list_files(): Lists all files in the data directory with metadata including path, size, modification time, file extension, line count, and word count.
-2. read_file(path): Reads the content of a specific file and returns its text. The path should be relative to the data directory.
-3. extract_text(file_path): Extracts text from a file in the data directory and returns its content.
+1. list_files(pattern, extensions, offset, limit): Lists files in the data directory with metadata including path, size, modification time, file extension, line count, and word count. Results are paginated; pass next_offset as offset to get the next page.
+2. read_file(path, offset, length, start_line, end_line): Reads the content of a specific file, or a byte/line range of it. The path should be relative to the data directory. Large files come back truncated; continue from next_offset.
+3. extract_text(file_path, offset, length, start_line, end_line): Extracts text from a file in the data directory and returns its content, with the same paging as read_file.
 4. summarize_file(file_path): Generates a concise summary (3 sentences or less) of the specified file.
-5. search(query, file_paths): Searches for the query in text files within the data directory. Returns a list of document chunks with their relevancy scores.
+5. search(query, file_paths, top_k, min_score, mode): Searches for the query in text files within the data directory. Returns the top_k most relevant document chunks with their relevancy scores.
+   - mode="lexical" matches exact keywords, identifiers and file names and is the fastest
+   - mode="vector" matches by meaning; the default "hybrid" combines both
    - You can search all files by providing just the query
    - You can search specific files by providing a list of file paths
 When users ask questions about their documents, use these tools to help them find relevant information. Always explain which tools you're using and why.
@@ -33,8 +41,306 @@ For example:
 Always provide helpful and accurate information based on the document content. If you can't find information in the documents, let the user know.
 """
 
-model = create_llm(Config.MODEL)
-memory = MemorySaver()
+@cached_factory
+def get_model() -> "BaseChatModel":
+    return create_llm(Config.MODEL)
+
+
+HISTORY_SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a document assistant.
+Keep the facts, file names and open questions that later turns may need, in {words} words or fewer.
+
+Summary so far:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+async def summarize_history(summary: str, messages: list["BaseMessage"]) -> str:
+    """Fold `messages` into the rolling summary of a session."""
+    from cog.summarizer import response_text
+
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if message.type == "tool":
+            lines.append(f"Tool {message.name}: {content[:Config.Server.Agent.MIN_TOOL_RESULT_CHARS]}")
+        elif content:
+            lines.append(f"{'User' if message.type == 'human' else 'Assistant'}: {content}")
+    prompt = HISTORY_SUMMARY_PROMPT.format(
+        words=Config.Memory.SUMMARY_WORDS, summary=summary or "(empty)", messages="\n".join(lines)
+    )
+    return response_text(await get_model().ainvoke(prompt))
+
+
+@cached_factory
+def get_store() -> "SessionStore":
+    from cog.memory import SessionStore
+
+    return SessionStore()
+
+
+@cached_factory
+def get_context_builder() -> "ContextBuilder":
+    from cog.memory import ContextBuilder
+
+    return ContextBuilder(get_store(), summarize_history)
+
+
+# session_id -> summary update started after the session's last turn
+_compactions: dict[str, asyncio.Task] = {}
+
+
+@cached_factory
+def get_tool_session() -> MCPToolSession:
+    return MCPToolSession(connection())
+
+
+def truncate_result(text: str, limit: int) -> str:
+    """Keep the head and tail of a tool result that does not fit its share of the context."""
+    if len(text) <= limit:
+        return text
+    note = "\n[... {} characters omitted; page through the file with offset/length for the rest ...]\n"
+    # the note counts against the limit too; len(text) is an upper bound on the number it shows
+    keep = max(limit - len(note.format(len(text))), 0)
+    head = keep * 3 // 4
+    tail = keep - head
+    return f"{text[:head]}{note.format(len(text) - keep)}{text[len(text) - tail:]}"
+
+
+def _result_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(part if isinstance(part, str) else str(part.get("text", part)) for part in content)
+    return str(content)
+
+
+@cached_factory
+def get_agent() -> "CompiledStateGraph":
+    """
+    Tool-calling loop over the MCP server's tools: the model step and the tool
+    step alternate until the model answers without calling tools, or until
+    `MAX_ITERATIONS` model steps, after which it must answer with what it has.
+    """
+    from langchain_core.messages import SystemMessage, ToolMessage
+    from langgraph.graph import END, START, MessagesState, StateGraph
+
+    from cog.memory import estimate_tokens
+
+    settings = Config.Server.Agent
+    window = Config.MODEL.num_ctx or Config.OLLAMA_CONTEXT_WINDOW
+
+    class AgentState(MessagesState):
+        # model steps taken in the current turn
+        iterations: int
+        # rolling summary of the turns older than `messages`
+        summary: str
+
+    def system_message(state: AgentState) -> SystemMessage:
+        system = SYSTEM_PROMPT
+        if state.get("summary"):
+            system += f"\nSummary of the earlier conversation:\n{state['summary']}\n"
+        return SystemMessage(system)
+
+    def context_room(state: AgentState, tools: list) -> int:
+        """Characters of tool output that still fit in the context window, leaving room for the answer."""
+        used = sum(estimate_tokens(message) for message in [system_message(state), *state["messages"]])
+        schemas = sum(len(tool.name) + len(tool.description or "") + len(json.dumps(tool.args)) for tool in tools)
+        used += schemas // Config.Summary.CHARS_PER_TOKEN
+        return max(window - settings.ANSWER_TOKENS - used, 0) * Config.Summary.CHARS_PER_TOKEN
+
+    async def call_model(state: AgentState, config: "RunnableConfig") -> dict:
+        tools = await get_tool_session().tools()
+        messages = [system_message(state), *state["messages"]]
+        model = get_model()
+        if state.get("iterations", 0) >= settings.MAX_ITERATIONS:
+            messages.append(SystemMessage("Tool call limit reached. Answer with the information gathered so far."))
+        elif tools and context_room(state, tools) < settings.MIN_TOOL_RESULT_CHARS:
+            # another round of results would not fit next to what this turn already gathered
+            messages.append(SystemMessage("The context is full. Answer with the information gathered so far."))
+        elif tools:
+            model = model.bind_tools(tools)
+        response = await model.ainvoke(messages, config)
+        return {"messages": [response], "iterations": state.get("iterations", 0) + 1}
+
+    async def call_tools(state: AgentState, config: "RunnableConfig") -> dict:
+        calls = state["messages"][-1].tool_calls
+        available = await get_tool_session().tools()
+        tools = {tool.name: tool for tool in available}
+        # the calls of one turn share the budget, so parallel reads cannot flood the context,
+        # and the budget shrinks as earlier iterations' results use up the window
+        room = context_room(state, available)
+        limit = max(
+            min(settings.TOOL_RESULT_BUDGET, room) // len(calls),
+            min(settings.MIN_TOOL_RESULT_CHARS, room // len(calls)),
+        )
+        semaphore = asyncio.Semaphore(settings.TOOL_CONCURRENCY)
+
+        async def run(call: dict) -> ToolMessage:
+            tool = tools.get(call["name"])
+            if tool is None:
+                return ToolMessage(f"Unknown tool: {call['name']}", tool_call_id=call["id"], name=call["name"], status="error")
+            async with semaphore:
+                try:
+                    result = await tool.ainvoke({**call, "type": "tool_call"}, config)
+                except Exception as e:
+                    return ToolMessage(f"Error: {e}", tool_call_id=call["id"], name=call["name"], status="error")
+            return result.model_copy(update={"content": truncate_result(_result_text(result.content), limit)})
+
+        return {"messages": await asyncio.gather(*(run(call) for call in calls))}
+
+    def route(state: AgentState) -> str:
+        return "tools" if getattr(state["messages"][-1], "tool_calls", None) else END
+
+    graph = StateGraph(AgentState)
+    graph.add_node("agent", call_model)
+    graph.add_node("tools", call_tools)
+    graph.add_edge(START, "agent")
+    graph.add_conditional_edges("agent", route, ["tools", END])
+    graph.add_edge("tools", "agent")
+    return graph.compile()
+
+
+@cached_factory
+def get_loop() -> BackgroundLoop:
+    """The loop every agent turn runs on, so async clients outlive a single turn."""
+    return BackgroundLoop(name="agent-loop")
+
+
+@dataclass(frozen=True)
+class TokenDelta:
+    text: str
+
+
+@dataclass(frozen=True)
+class ToolStart:
+    run_id: str
+    name: str
+    args: Any
+
+
+@dataclass(frozen=True)
+class ToolEnd:
+    run_id: str
+    name: str
+    output: str
+    seconds: float
+
+
+@dataclass(frozen=True)
+class FinalAnswer:
+    text: str
+    # seconds from the start of the turn to the first streamed token
+    time_to_first_token: float | None
+    tokens: int
+    # seconds spent generating, from the first token to the end of the turn
+    generation_seconds: float
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.generation_seconds if self.generation_seconds > 0 else 0.0
+
+
+AgentEvent = TokenDelta | ToolStart | ToolEnd | FinalAnswer
+
+
+def _run_config() -> dict:
+    return {
+        # each iteration is a model step and a tool step, plus the forced final answer
+        "recursion_limit": 2 * Config.Server.Agent.MAX_ITERATIONS + 2,
+    }
+
+
+async def astream_events(prompt: str, session_id: str) -> AsyncIterator[AgentEvent]:
+    """
+    Run one agent turn and yield its events as they happen: token deltas from
+    every model call, tool starts and ends, then a single `FinalAnswer`.
+    The history comes from the session store and the turn is saved back to it.
+    """
+    from langchain_core.messages import HumanMessage
+
+    agent = get_agent()
+    builder = get_context_builder()
+    start = time.perf_counter()
+    pending = _compactions.pop(session_id, None)
+    if pending is not None:
+        await asyncio.gather(pending, return_exceptions=True)
+    await asyncio.to_thread(builder.store.evict_idle)
+    summary, history = await asyncio.to_thread(builder.build, session_id)
+    first_token: float | None = None
+    streamed_tokens = 0
+    reported_tokens = 0
+    tool_started: dict[str, float] = {}
+    final_state: dict = {}
+    turn = {"messages": [*history, HumanMessage(prompt)], "iterations": 0, "summary": summary}
+    async for event in agent.astream_events(turn, _run_config(), version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream":
+            text = event["data"]["chunk"].content
+            if isinstance(text, str) and text:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                streamed_tokens += 1
+                yield TokenDelta(text)
+        elif kind == "on_chat_model_end":
+            usage = getattr(event["data"].get("output"), "usage_metadata", None) or {}
+            reported_tokens += usage.get("output_tokens", 0)
+        elif kind == "on_tool_start":
+            tool_started[event["run_id"]] = time.perf_counter()
+            yield ToolStart(event["run_id"], event["name"], event["data"].get("input"))
+        elif kind == "on_tool_end":
+            output = event["data"].get("output")
+            yield ToolEnd(
+                event["run_id"],
+                event["name"],
+                str(getattr(output, "content", output)),
+                time.perf_counter() - tool_started.pop(event["run_id"], start),
+            )
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            final_state = event["data"].get("output") or {}
+    messages = final_state.get("messages", [])
+    text = str(messages[-1].content) if messages else ""
+    if first_token is None and text:
+        # served from the response cache, nothing was streamed
+        first_token = time.perf_counter()
+        yield TokenDelta(text)
+    end = time.perf_counter()
+    if messages:
+        await asyncio.to_thread(builder.store.append, session_id, messages[len(history):])
+        # fold turns that left the verbatim window while the user reads the answer
+        _compactions[session_id] = asyncio.create_task(builder.compact(session_id))
+    yield FinalAnswer(
+        text=text,
+        time_to_first_token=None if first_token is None else first_token - start,
+        tokens=reported_tokens or streamed_tokens,
+        generation_seconds=0.0 if first_token is None else end - first_token,
+    )
+
+
+def stream_events(prompt: str, session_id: str) -> Iterator[AgentEvent]:
+    """Blocking view of `astream_events` for sync callers such as Streamlit."""
+    return get_loop().iterate(astream_events(prompt, session_id))
+
+
+def invoke(prompt: str, session_id: str) -> str:
+    """Run one turn and return the final answer."""
+    answer = ""
+    for event in stream_events(prompt, session_id):
+        if isinstance(event, FinalAnswer):
+            answer = event.text
+    return answer
+
 
+def get_session_history(session_id: str) -> list["BaseMessage"]:
+    """Messages of a session still in the store, oldest first."""
+    return [stored.message for stored in get_store().messages(session_id)]
 
 
+agent_runnable = {
+    "invoke": invoke,
+    "stream": stream_events,
+    "astream": astream_events,
+}
@@ -0,0 +1,125 @@
+import re
+from dataclasses import dataclass
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+
+from cog.config import Config
+from cog.scoring import normalize_rows
+
+MARKDOWN_HEADING = re.compile(r"^#{1,6}\s", re.MULTILINE)
+# top-level definitions, including the decorators stacked on them
+PYTHON_DEFINITION = re.compile(r"^(?:@|(?:async\s+)?def\s|class\s)", re.MULTILINE)
+SENTENCE_END = re.compile(r"(?<=[.?!])\s+")
+
+
+@dataclass
+class Chunk:
+    text: str
+    # set when the strategy already knows the chunk's embedding
+    vector: list[float] | None = None
+
+
+class RecursiveStrategy:
+    """Fixed-size character chunks, the same splitter `_build_vector_store` uses."""
+    name = "recursive"
+
+    def __init__(self, chunk_size: int = Config.Chunking.CHUNK_SIZE, chunk_overlap: int = Config.Chunking.CHUNK_OVERLAP):
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def chunk(self, text: str, suffix: str = "") -> list[Chunk]:
+        return [Chunk(part) for part in self.splitter.split_text(text) if part.strip()]
+
+
+class StructureStrategy(RecursiveStrategy):
+    """
+    Splits on document structure first: Markdown headings and top-level Python
+    `def`/`class` blocks. Small sections are merged up to `chunk_size` and
+    oversized ones fall back to recursive splitting.
+    """
+    name = "structure"
+    boundaries = {".md": MARKDOWN_HEADING, ".py": PYTHON_DEFINITION}
+
+    def __init__(self, chunk_size: int = Config.Chunking.CHUNK_SIZE, chunk_overlap: int = Config.Chunking.CHUNK_OVERLAP):
+        super().__init__(chunk_size, chunk_overlap)
+        self.chunk_size = chunk_size
+
+    def _sections(self, text: str, boundary: re.Pattern) -> list[str]:
+        starts = [m.start() for m in boundary.finditer(text)]
+        # a run of decorators belongs to the definition below it
+        starts = [s for i, s in enumerate(starts) if i == 0 or text[starts[i - 1]] != "@"]
+        cuts = sorted({0, *starts, len(text)})
+        return [text[a:b] for a, b in zip(cuts, cuts[1:])]
+
+    def chunk(self, text: str, suffix: str = "") -> list[Chunk]:
+        boundary = self.boundaries.get(suffix)
+        if boundary is None:
+            return super().chunk(text, suffix)
+        chunks: list[Chunk] = []
+        buffer = ""
+        for section in self._sections(text, boundary):
+            if len(buffer) + len(section) <= self.chunk_size:
+                buffer += section
+                continue
+            if buffer.strip():
+                chunks.append(Chunk(buffer))
+            if len(section) > self.chunk_size:
+                chunks.extend(super().chunk(section, suffix))
+                buffer = ""
+            else:
+                buffer = section
+        if buffer.strip():
+            chunks.append(Chunk(buffer))
+        return chunks
+
+
+class SemanticStrategy:
+    """
+    Breaks text where the meaning of adjacent sentences shifts the most
+    (distances above the `percentile`-th percentile). The sentence embeddings
+    computed to find those breakpoints are averaged into the chunk vectors,
+    so each file costs a single embedding call.
+    """
+    name = "semantic"
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        percentile: float = Config.Chunking.SEMANTIC_PERCENTILE,
+        buffer_size: int = 1,
+    ):
+        self.embedder = embedder
+        self.percentile = percentile
+        self.buffer_size = buffer_size
+
+    def chunk(self, text: str, suffix: str = "") -> list[Chunk]:
+        sentences = [s for s in SENTENCE_END.split(text) if s.strip()]
+        if not sentences:
+            return []
+        # each sentence is embedded together with its neighbours to smooth the signal
+        windows = [
+            " ".join(sentences[max(i - self.buffer_size, 0):i + self.buffer_size + 1])
+            for i in range(len(sentences))
+        ]
+        vectors = normalize_rows(np.asarray(self.embedder.embed_documents(windows), dtype=np.float32))
+        if len(sentences) == 1:
+            return [Chunk(sentences[0], vectors[0].tolist())]
+        distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+        breaks = np.flatnonzero(distances > np.percentile(distances, self.percentile)) + 1
+        bounds = [0, *breaks.tolist(), len(sentences)]
+        return [
+            Chunk(" ".join(sentences[a:b]), normalize_rows(vectors[a:b].mean(axis=0, keepdims=True))[0].tolist())
+            for a, b in zip(bounds, bounds[1:])
+        ]
+
+
+def create_chunker(strategy: str, embedder: Embeddings):
+    """Build the chunking strategy named in `Config.Chunking.STRATEGY`."""
+    if strategy == RecursiveStrategy.name:
+        return RecursiveStrategy()
+    if strategy == StructureStrategy.name:
+        return StructureStrategy()
+    if strategy == SemanticStrategy.name:
+        return SemanticStrategy(embedder)
+    raise ValueError(f"Unsupported chunking strategy: {strategy}")
@@ -0,0 +1,56 @@
+import asyncio
+import functools
+import threading
+
+
+def limit_concurrency(limit: int):
+    """Allow at most `limit` concurrent runs of the decorated coroutine function."""
+    def decorator(fn):
+        semaphore = asyncio.Semaphore(limit)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            async with semaphore:
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cached_factory(fn):
+    """`functools.cache` for lazy factories, safe when first called from several threads."""
+    cached = functools.cache(fn)
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with lock:
+            return cached(*args, **kwargs)
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+class BackgroundLoop:
+    """
+    An event loop running forever in a daemon thread, so sync callers (e.g.
+    Streamlit reruns) can share async clients and sessions across calls.
+    """
+
+    def __init__(self, name: str = "background-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, agen):
+        """Drive an async generator on the loop, yielding its items to the calling thread."""
+        while True:
+            try:
+                yield self.run(agen.__anext__())
+            except StopAsyncIteration:
+                return
+            except GeneratorExit:
+                self.run(agen.aclose())
+                raise
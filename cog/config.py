@@ -12,17 +12,31 @@ class ModelProvider(str, Enum):
 class EmbeddingConfig:
     endpoint: str
     model: str
+    batch_size: int = 64
+    max_workers: int = 4
+    timeout: float = 60.0
+    max_retries: int = 3
 
 embedding_config = EmbeddingConfig(
-    endpoint="http://ollama.iotech.my.id",  # or your actual endpoint
+    endpoint=os.getenv("OLLAMA_EMBED_ENDPOINT", "http://ollama.iotech.my.id"),  # or your actual endpoint
     model="bge-m3:latest"
 )   
-@dataclass
+@dataclass(frozen=True)
 class ModelConfig:
     provider: ModelProvider
     name: str
     temperature: float = 0.7
-    base_url : str = "https://ollama.iotech.my.id"  
+    base_url : str = os.getenv("OLLAMA_BASE_URL", "https://ollama.iotech.my.id")
+    # how long Ollama keeps the model loaded after a request
+    keep_alive: str | int | None = "30m"
+    # None falls back to Config.OLLAMA_CONTEXT_WINDOW
+    num_ctx: int | None = None
+    # concurrent connections to base_url for this model, shared by all its clients
+    max_concurrency: int = 4
+    # load the model in the background as soon as its client is created
+    warm_up: bool = False
+    # serve repeated prompts from the response cache (Config.ResponseCache)
+    cache: bool = True
 
 
 
@@ -41,6 +55,115 @@ class Config:
     class Path:
         APP_HOME= Path(os.getenv("APP_HOME",  Path(__file__).parent.parent))
         DATA_DIR = APP_HOME / "data"
+        CACHE_DIR = Path(os.getenv("CACHE_DIR", APP_HOME / ".cache"))
+
+    class Search:
+        SUFFIXES = (".txt", ".md", ".py", ".json", ".jsonl", ".pdf")
+        INDEX_FILE = "index.sqlite3"
+        TOP_K = 5
+        MIN_SCORE = 0.0
+        # float32 stores only: above this many rows each process builds an HNSW index. Quantized
+        # stores are always scanned exactly in blocks from the shared map; a private per-process
+        # index there would outgrow the store it is meant to share, and was slower at equal recall
+        FAISS_THRESHOLD = 50_000
+        HNSW_M = 32
+        HNSW_EF_SEARCH = 64
+        # memory-mapped file shared by every process serving the index
+        VECTOR_FILE = "vectors.store"
+        # held by the one process that scans, embeds and writes the index; the others only read it
+        WRITER_LOCK_FILE = "index.lock"
+        # "int8" and "float16" quantize the shared vectors; "float32" stores them as they are
+        VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "int8")
+        # quantized top candidates re-scored in float32, as a multiple of top_k; 0 disables it
+        RESCORE_CANDIDATES = 4
+        # rows dequantized at a time while scoring
+        SCORE_BLOCK_ROWS = 256
+        # "hybrid" fuses BM25 and vector rankings, "lexical" needs no embedding call
+        MODE = "hybrid"
+        # candidates taken from each ranking before fusion, as a multiple of top_k
+        HYBRID_CANDIDATES = 4
+        RRF_K = 60
+        BM25_K1 = 1.5
+        BM25_B = 0.75
+
+    class Models:
+        # keep the server's chat model loaded in Ollama while the server runs
+        KEEP_WARM = os.getenv("KEEP_WARM", "0") == "1"
+        # re-warm resident models well before a "30m" keep_alive expires
+        KEEP_ALIVE_INTERVAL = 600
+
+    class ResponseCache:
+        ENABLED = os.getenv("RESPONSE_CACHE", "1") != "0"
+        FILE = "responses.sqlite3"
+        MAX_ENTRIES = 5_000
+        MEMORY_ENTRIES = 500
+        # cosine similarity above which a different prompt reuses a cached answer; None disables it
+        SIMILARITY_THRESHOLD: float | None = None
+        # how often the data directory is checked for changes that invalidate entries
+        DATA_CHECK_SECONDS = 2.0
+
+    class Memory:
+        FILE = "sessions.sqlite3"
+        # sessions idle for longer than this are deleted
+        TTL_SECONDS = 7 * 24 * 3600
+        # recent history sent verbatim with each turn; older turns live in the summary
+        HISTORY_TOKENS = 1200
+        SUMMARY_WORDS = 150
+        # messages kept per session once they are folded into the summary
+        MAX_STORED_MESSAGES = 200
+
+    class Ingest:
+        FILE = "extracted.sqlite3"
+        # processes parsing CPU-heavy formats (PDF, JSON)
+        WORKERS = min(4, os.cpu_count() or 1)
+        # a lone file below this is parsed in the calling thread
+        PROCESS_MIN_BYTES = 256 * 1024
+        MAX_ENTRIES = 5_000
+
+    class Metrics:
+        # when off, spans and counters reduce to a shared no-op
+        ENABLED = os.getenv("METRICS", "1") != "0"
+        # stream spans and token counts as live events on /events
+        EVENTS = os.getenv("METRICS_EVENTS", "0") == "1"
+        EVENT_QUEUE = 1000
+        HEARTBEAT_SECONDS = 15
+        LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+        SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+    class Chunking:
+        # "recursive", "structure" (Markdown headings, Python def/class) or "semantic"
+        STRATEGY = "structure"
+        CHUNK_SIZE = 1024
+        CHUNK_OVERLAP = 100
+        SEMANTIC_PERCENTILE = 95
+        # chunker outputs kept for files that are no longer indexed
+        CACHE_ENTRIES = 1000
+
+    class EmbeddingCache:
+        MAX_ENTRIES = 20_000
+        FILE = "embeddings.sqlite3"
+
+    class Files:
+        PAGE_SIZE = 100
+        STATS_WORKERS = 4
+        READ_BLOCK = 1 << 20
+        # read_file / extract_text never return more than this in one call
+        MAX_READ_BYTES = 64 * 1024
+        LINE_INDEX_STRIDE = 1024
+        LINE_INDEX_CACHE = 64
+
+    class Summary:
+        # rough average for English text and code
+        CHARS_PER_TOKEN = 4
+        # leaves room in OLLAMA_CONTEXT_WINDOW for the prompt and the answer
+        CHUNK_TOKENS = 2048
+        CHUNK_OVERLAP_TOKENS = 64
+        MAX_CONCURRENCY = 4
+        CACHE_FILE = "summaries.sqlite3"
+
+    class Watcher:
+        DEBOUNCE_SECONDS = 0.5
+        WORKERS = 2
     
     class Server:
         HOST ="0.0.0.0"
@@ -48,6 +171,28 @@ class Config:
         SSE_PATH = "/sse"
         TRANSPORT = "streamable-http"
 
+        class Concurrency:
+            """Maximum number of in-flight calls per MCP tool."""
+            SEARCH = 8
+            SUMMARIZE_FILE = 2
+            LIST_FILES = 4
+            READ_FILE = 16
+
         class Agent:
             MAX_ITERATIONS = 10
+            # tool calls from one model turn that run at the same time
+            TOOL_CONCURRENCY = 4
+            # characters of tool output fed back per model turn, shared by its tool calls;
+            # less once the turn's earlier results fill up OLLAMA_CONTEXT_WINDOW
+            TOOL_RESULT_BUDGET = 6000
+            # below this a single tool result is only cut when the context has no more room
+            MIN_TOOL_RESULT_CHARS = 500
+            # tokens of the context window kept free for the model's answer
+            ANSWER_TOKENS = 512
+            # URL of a running server's MCP endpoint; unset spawns server.py over stdio
+            MCP_URL = os.getenv("MCP_URL")
+
+    class App:
+        # minimum seconds between re-renders of a streaming answer
+        RENDER_INTERVAL = 0.1
             
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from cog.config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, hash)
+) WITHOUT ROWID;
+"""
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_BATCH = 500
+
+
+def model_name(embeddings: Embeddings) -> str:
+    """Best-effort identifier of the model behind an `Embeddings` instance."""
+    return str(
+        getattr(embeddings, "model", None)
+        or getattr(embeddings, "model_name", None)
+        or type(embeddings).__name__
+    )
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed cache in front of any `Embeddings`.
+    Vectors are keyed by model name plus text hash, held in a bounded in-memory
+    LRU and persisted to SQLite, so entries of another model are never served.
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        max_entries: int = Config.EmbeddingCache.MAX_ENTRIES,
+        db_path: Path | None = None,
+    ):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.db_path = db_path or Config.Path.CACHE_DIR / Config.EmbeddingCache.FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lru: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def model(self) -> str:
+        """Read on every call, so switching the wrapped model switches the cache namespace."""
+        return model_name(self.inner)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._lru),
+        }
+
+    def _remember(self, key: tuple[str, str], vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, model: str, hashes: list[str]) -> dict[str, np.ndarray]:
+        """Resolve as many hashes as possible from memory, then from disk."""
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for h in hashes:
+                vector = self._lru.get((model, h))
+                if vector is not None:
+                    self._lru.move_to_end((model, h))
+                    found[h] = vector
+            self.memory_hits += len(found)
+            pending = [h for h in hashes if h not in found]
+            for i in range(0, len(pending), LOOKUP_BATCH):
+                batch = pending[i:i + LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    (model, *batch),
+                ).fetchall()
+                for h, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[h] = vector
+                    self._remember((model, h), vector)
+                self.disk_hits += len(rows)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def _store(self, model: str, hashes: list[str], vectors: list[list[float]]) -> dict[str, np.ndarray]:
+        stored = {h: np.asarray(v, dtype=np.float32) for h, v in zip(hashes, vectors)}
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(model, h, v.tobytes()) for h, v in stored.items()],
+            )
+            for h, vector in stored.items():
+                self._remember((model, h), vector)
+        return stored
+
+    def _plan(self, texts: list[str]) -> tuple[str, list[str], dict[str, np.ndarray], dict[str, str]]:
+        model = self.model
+        hashes = [text_hash(t) for t in texts]
+        unique = list(dict.fromkeys(hashes))
+        found = self._lookup(model, unique)
+        missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+        return model, hashes, found, missing
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        texts = list(texts)
+        model, hashes, found, missing = self._plan(texts)
+        if missing:
+            found.update(self._store(model, list(missing), self.inner.embed_documents(list(missing.values()))))
+        return [found[h].tolist() for h in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        texts = list(texts)
+        # the lookups and writes are SQLite I/O behind a lock that indexing threads hold too
+        model, hashes, found, missing = await asyncio.to_thread(self._plan, texts)
+        if missing:
+            vectors = await self.inner.aembed_documents(list(missing.values()))
+            found.update(await asyncio.to_thread(self._store, model, list(missing), vectors))
+        return [found[h].tolist() for h in hashes]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
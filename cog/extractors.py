@@ -0,0 +1,284 @@
+import json
+import logging
+import multiprocessing
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from cog.config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extracted (
+    sha256 TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    text TEXT NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (sha256, extractor)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS extracted_used ON extracted (used);
+"""
+
+
+@dataclass(frozen=True)
+class Extractor:
+    name: str
+    fn: Callable[[Path], str]
+    # parsed in the process pool instead of the calling thread
+    cpu_bound: bool = False
+    # the file's bytes are not text, so readers must use the extracted text
+    binary: bool = False
+    # the output is the file's text unchanged, so readers can map the file itself
+    raw: bool = False
+    # bump when the output changes, so cached extractions are redone
+    version: int = 1
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.version}"
+
+
+EXTRACTORS: dict[str, Extractor] = {}
+
+
+def register(
+    *suffixes: str, name: str, cpu_bound: bool = False, binary: bool = False, raw: bool = False, version: int = 1
+):
+    """Register the decorated `fn(path) -> str` as the extractor for `suffixes`."""
+    def decorator(fn):
+        extractor = Extractor(name, fn, cpu_bound, binary, raw, version)
+        for suffix in suffixes:
+            EXTRACTORS[suffix.lower()] = extractor
+        return fn
+    return decorator
+
+
+def extractor_for(path: Path) -> Extractor:
+    """The registered extractor for `path`, plain text when its suffix is unknown."""
+    return EXTRACTORS.get(path.suffix.lower(), EXTRACTORS[".txt"])
+
+
+def is_binary(path: Path) -> bool:
+    return extractor_for(Path(path)).binary
+
+
+def extractors_version() -> str:
+    """Changes whenever the extractor of an indexed suffix does."""
+    return ",".join(f"{suffix}={extractor_for(Path(f'x{suffix}')).key}" for suffix in sorted(Config.Search.SUFFIXES))
+
+
+@register(".txt", ".rst", ".csv", ".log", name="text", raw=True)
+def extract_text(path: Path) -> str:
+    return path.read_text(encoding="utf-8", errors="replace")
+
+
+MARKDOWN_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+MARKDOWN_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+@register(".md", ".markdown", name="markdown")
+def extract_markdown(path: Path) -> str:
+    """Markdown with headings kept for chunking, and links, images and comments reduced to their text."""
+    text = extract_text(path)
+    text = HTML_COMMENT.sub("", text)
+    text = MARKDOWN_IMAGE.sub(r"\1", text)
+    return MARKDOWN_LINK.sub(r"\1", text)
+
+
+@register(
+    ".py", ".js", ".ts", ".java", ".go", ".rs", ".c", ".h", ".cpp", ".sh", ".sql", ".toml", ".yaml", ".yml",
+    name="code", raw=True,
+)
+def extract_code(path: Path) -> str:
+    return extract_text(path)
+
+
+def flatten_json(value, prefix: str = "") -> list[str]:
+    """One `dotted.path[index]: value` line per leaf, so keys stay next to their values."""
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            lines.extend(flatten_json(item, f"{prefix}.{key}" if prefix else str(key)))
+        return lines
+    if isinstance(value, list):
+        lines = []
+        for i, item in enumerate(value):
+            lines.extend(flatten_json(item, f"{prefix}[{i}]"))
+        return lines
+    return [f"{prefix}: {value}" if prefix else str(value)]
+
+
+@register(".json", name="json", cpu_bound=True)
+def extract_json(path: Path) -> str:
+    text = extract_text(path)
+    try:
+        return "\n".join(flatten_json(json.loads(text)))
+    except ValueError:
+        return text
+
+
+@register(".jsonl", ".ndjson", name="jsonl", cpu_bound=True)
+def extract_jsonl(path: Path) -> str:
+    lines = []
+    for i, line in enumerate(extract_text(path).splitlines()):
+        if not line.strip():
+            continue
+        try:
+            lines.extend(flatten_json(json.loads(line), f"[{i}]"))
+        except ValueError:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+@register(".pdf", name="pdf", cpu_bound=True, binary=True)
+def extract_pdf(path: Path) -> str:
+    """Text of every page, pages separated by a blank line."""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_range().replace("\r\n", "\n"))
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    return "\n\n".join(pages)
+
+
+def run_extractor(path: str) -> str:
+    """Process pool entry point; looks the extractor up again in the worker."""
+    path = Path(path)
+    return extractor_for(path).fn(path)
+
+
+class TextStore:
+    """
+    Extracted text shared by the index, `read_file`/`extract_text` and
+    `list_files`. Results are cached on disk by file hash and extractor, so a
+    file is parsed once however many tools ask for it; CPU-heavy formats are
+    parsed in a process pool.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.Ingest.WORKERS,
+        max_entries: int = Config.Ingest.MAX_ENTRIES,
+        db_path: Path | None = None,
+    ):
+        self.workers = workers
+        self.max_entries = max_entries
+        self.db_path = db_path or Config.Path.CACHE_DIR / Config.Ingest.FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        # path -> (mtime, size, sha256), so unchanged files are not hashed again
+        self._digests: dict[str, tuple[float, int, str]] = {}
+        self._pool: ProcessPoolExecutor | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs threads and event loops is unsafe
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def digest(self, path: Path) -> str:
+        from cog.index import file_digest
+
+        stat = path.stat()
+        with self._lock:
+            entry = self._digests.get(str(path))
+        if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+            return entry[2]
+        digest = file_digest(path)
+        with self._lock:
+            self._digests[str(path)] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def _cached(self, digest: str, extractor: Extractor) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM extracted WHERE sha256 = ? AND extractor = ?", (digest, extractor.key)
+            ).fetchone()
+            if row is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE extracted SET used = ? WHERE sha256 = ? AND extractor = ?",
+                        (time.time(), digest, extractor.key),
+                    )
+        return None if row is None else row[0]
+
+    def _store(self, digest: str, extractor: Extractor, text: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracted VALUES (?, ?, ?, ?)", (digest, extractor.key, text, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM extracted WHERE used < (SELECT used FROM extracted ORDER BY used DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries - 1,),
+            )
+
+    def get(self, path: Path, digest: str | None = None) -> str:
+        return self.get_many([(path, digest)])[path]
+
+    def get_many(self, items: list[tuple[Path, str | None]], skip_errors: bool = False) -> dict[Path, str]:
+        """
+        Text of every `(path, digest)`; pass the digest when it is already
+        known. Cache misses of CPU-bound formats are parsed in parallel in the
+        process pool while the others are read in this thread. With
+        `skip_errors`, a file that cannot be read or parsed is logged and left
+        out of the result instead of failing the whole batch.
+        """
+        texts: dict[Path, str] = {}
+        misses: list[tuple[Path, str, Extractor]] = []
+        for path, digest in items:
+            digest = digest or self.digest(path)
+            extractor = extractor_for(path)
+            text = self._cached(digest, extractor)
+            if text is not None:
+                self.hits += 1
+                texts[path] = text
+            else:
+                self.misses += 1
+                misses.append((path, digest, extractor))
+        heavy = [path for path, _, extractor in misses if extractor.cpu_bound]
+        # a single small file is cheaper to parse here than to ship to a worker
+        use_pool = len(heavy) > 1 or any(path.stat().st_size >= Config.Ingest.PROCESS_MIN_BYTES for path in heavy)
+        futures: dict[Path, Future] = {
+            path: self._executor().submit(run_extractor, str(path)) for path in heavy
+        } if use_pool else {}
+        for path, digest, extractor in misses:
+            future = futures.get(path)
+            try:
+                text = future.result() if future is not None else extractor.fn(path)
+            except Exception as e:
+                if not skip_errors:
+                    raise
+                logger.warning("Could not extract text from %s: %s", path, e)
+                continue
+            self._store(digest, extractor, text)
+            texts[path] = text
+        return texts
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,180 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+from cog.config import Config
+
+
+@dataclass
+class TextSlice:
+    text: str
+    offset: int
+    end: int
+    total_size: int
+    # where the requested range ends, before the `max_bytes` cap
+    requested_end: int | None = None
+    start_line: int | None = None
+    end_line: int | None = None
+
+    @property
+    def truncated(self) -> bool:
+        """Whether `max_bytes` cut the requested range short."""
+        return self.end < (self.total_size if self.requested_end is None else self.requested_end)
+
+    @property
+    def eof(self) -> bool:
+        return self.end >= self.total_size
+
+
+def resolve_data_path(path: str, data_dir: Path = Config.Path.DATA_DIR) -> Path:
+    """Resolve `path` inside the data directory, refusing anything that escapes it."""
+    root = data_dir.resolve()
+    full_path = (root / path).resolve()
+    if not full_path.is_relative_to(root):
+        raise PermissionError(f"Path outside the data directory: {path}")
+    return full_path
+
+
+@contextmanager
+def mapped(path: Path):
+    """Read-only memory map of `path`; empty files map to an empty bytes object."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _char_start(buf, pos: int) -> int:
+    """Move `pos` back to the first byte of the UTF-8 character it points into."""
+    while 0 < pos < len(buf) and (buf[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+class LineIndex:
+    """
+    Sparse line-offset index: the byte offset of every `stride`-th line.
+    Built once per file version, it turns a line-range read into a short scan
+    from the nearest checkpoint instead of a scan from the start of the file.
+    """
+
+    def __init__(self, buf, stride: int = Config.Files.LINE_INDEX_STRIDE):
+        self.stride = stride
+        self.checkpoints = [0]
+        pos, line = 0, 0
+        while True:
+            pos = buf.find(b"\n", pos) + 1
+            if pos == 0:
+                break
+            line += 1
+            if line % stride == 0:
+                self.checkpoints.append(pos)
+        self.line_count = line + (1 if len(buf) and buf[-1:] != b"\n" else 0)
+
+    def offset(self, buf, line: int) -> int:
+        """Byte offset where zero-based `line` starts (or the end of the buffer)."""
+        checkpoint = min(line // self.stride, len(self.checkpoints) - 1)
+        pos = self.checkpoints[checkpoint]
+        for _ in range(line - checkpoint * self.stride):
+            pos = buf.find(b"\n", pos) + 1
+            if pos == 0:
+                return len(buf)
+        return pos
+
+
+_line_indexes: OrderedDict[tuple[str, float, int], LineIndex] = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+
+def _line_index(path: Path, buf) -> LineIndex:
+    stat = path.stat()
+    key = (str(path), stat.st_mtime, stat.st_size)
+    with _line_indexes_lock:
+        index = _line_indexes.get(key)
+        if index is not None:
+            _line_indexes.move_to_end(key)
+            return index
+    index = LineIndex(buf)
+    with _line_indexes_lock:
+        _line_indexes[key] = index
+        while len(_line_indexes) > Config.Files.LINE_INDEX_CACHE:
+            _line_indexes.popitem(last=False)
+    return index
+
+
+def _slice(
+    buf,
+    line_index: Callable[[], LineIndex],
+    offset: int,
+    length: int | None,
+    start_line: int | None,
+    end_line: int | None,
+    max_bytes: int,
+) -> TextSlice:
+    size = len(buf)
+    if start_line is not None or end_line is not None:
+        index = line_index()
+        first = max((start_line or 1) - 1, 0)
+        offset = index.offset(buf, first)
+        stop = index.offset(buf, end_line) if end_line is not None else size
+        length = max(stop - offset, 0)
+    offset = _char_start(buf, min(max(offset, 0), size))
+    requested_end = size if length is None else _char_start(buf, min(offset + max(length, 0), size))
+    if length is None or length > max_bytes:
+        length = max_bytes
+    end = min(offset + max(length, 0), size)
+    if end < size:
+        end = _char_start(buf, end)
+    text = bytes(buf[offset:end]).decode("utf-8", errors="replace")
+    result = TextSlice(text=text, offset=offset, end=end, total_size=size, requested_end=requested_end)
+    if start_line is not None or end_line is not None:
+        result.start_line = first + 1
+        result.end_line = first + text.count("\n") + (0 if text.endswith("\n") or not text else 1)
+    return result
+
+
+def read_slice(
+    path: Path,
+    offset: int = 0,
+    length: int | None = None,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    max_bytes: int = Config.Files.MAX_READ_BYTES,
+) -> TextSlice:
+    """
+    Read part of a text file through a memory map, so the cost is O(slice).
+    Lines are 1-based and inclusive; when a line range is given it takes
+    precedence over `offset`/`length`. The slice never exceeds `max_bytes`
+    and is cut on UTF-8 character boundaries.
+    """
+    with mapped(path) as buf:
+        return _slice(buf, lambda: _line_index(path, buf), offset, length, start_line, end_line, max_bytes)
+
+
+def slice_text(
+    text: str,
+    offset: int = 0,
+    length: int | None = None,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    max_bytes: int = Config.Files.MAX_READ_BYTES,
+) -> TextSlice:
+    """`read_slice` over already extracted text; offsets are into its UTF-8 encoding."""
+    buf = text.encode("utf-8")
+    return _slice(buf, lambda: LineIndex(buf), offset, length, start_line, end_line, max_bytes)
+
+
+def iter_file(path: Path, offset: int = 0, length: int | None = None,
+              block_size: int = Config.Files.READ_BLOCK) -> Iterator[bytes]:
+    """Yield `path[offset:offset + length]` in blocks of at most `block_size` bytes."""
+    with mapped(path) as buf:
+        end = len(buf) if length is None else min(offset + length, len(buf))
+        for start in range(max(offset, 0), end, block_size):
+            yield bytes(buf[start:min(start + block_size, end)])
@@ -0,0 +1,83 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from cog.config import Config
+from cog.extractors import is_binary
+
+
+def count_lines_words(path: str, block_size: int = Config.Files.READ_BLOCK) -> tuple[int, int]:
+    """Count lines and words with bounded memory by streaming the file in blocks."""
+    lines = words = 0
+    in_word = False
+    last = b""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            lines += block.count(b"\n")
+            words += len(block.split())
+            # a word cut in two by the block boundary was counted twice
+            if in_word and not block[:1].isspace():
+                words -= 1
+            in_word = not block[-1:].isspace()
+            last = block[-1:]
+    if last and last != b"\n":
+        lines += 1  # final line without a trailing newline
+    return lines, words
+
+
+def count_text(text: str) -> tuple[int, int]:
+    return text.count("\n") + (1 if text and not text.endswith("\n") else 0), len(text.split())
+
+
+class FileStatsCache:
+    """
+    Line and word counts keyed by (path, mtime, size).
+    Unchanged files are never read again; misses are counted in a thread pool.
+    Binary formats such as PDF are counted on their text from `extract`.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.Files.STATS_WORKERS,
+        extract: Callable[[Path], str] | None = None,
+    ):
+        self._entries: dict[str, tuple[float, int, int, int]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="file-stats")
+        self.extract = extract
+
+    def _count(self, path: str) -> tuple[int, int]:
+        if self.extract is not None and is_binary(Path(path)):
+            return count_text(self.extract(Path(path)))
+        return count_lines_words(path)
+
+    def get_many(self, items: list[tuple[str, os.stat_result]]) -> list[tuple[int | None, int | None]]:
+        """Return `(line_count, word_count)` per `(path, stat)`, or Nones when unreadable."""
+        results: list[tuple[int | None, int | None]] = [(None, None)] * len(items)
+        misses = []
+        with self._lock:
+            for i, (path, stat) in enumerate(items):
+                entry = self._entries.get(path)
+                if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+                    results[i] = entry[2:]
+                else:
+                    misses.append(i)
+        futures = [(i, self._executor.submit(self._count, items[i][0])) for i in misses]
+        for i, future in futures:
+            path, stat = items[i]
+            try:
+                counts = future.result()
+            except Exception:
+                continue
+            results[i] = counts
+            with self._lock:
+                self._entries[path] = (stat.st_mtime, stat.st_size, *counts)
+        return results
+
+    def prune(self, keep: set[str]):
+        """Forget files that no longer exist."""
+        with self._lock:
+            for path in self._entries.keys() - keep:
+                del self._entries[path]
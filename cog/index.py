@@ -0,0 +1,411 @@
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from cog import lexical, metrics
+from cog.chunking import Chunk
+from cog.config import Config
+from cog.extractors import TextStore, extractors_version
+from cog.vector_store import VectorStore, read_header, write_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    ordinal INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    vector BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks(path);
+CREATE TABLE IF NOT EXISTS chunk_cache (
+    sha256 TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    chunks TEXT NOT NULL,
+    vectors BLOB,
+    used REAL NOT NULL,
+    PRIMARY KEY (sha256, strategy)
+);
+"""
+
+
+@dataclass
+class IndexSnapshot:
+    """
+    Immutable view of the indexed chunks: one generation of the shared,
+    memory-mapped vector store. Row i belongs to chunk `ids[i]`. Without a
+    store (nothing published yet) the snapshot is empty.
+    """
+    store: VectorStore | None
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.store.ids if self.store is not None else np.empty(0, dtype=np.int64)
+
+    @property
+    def paths(self) -> Sequence[str]:
+        return self.store.paths if self.store is not None else []
+
+    @property
+    def texts(self) -> Sequence[str]:
+        return self.store.texts if self.store is not None else []
+
+    @property
+    def generation(self) -> int:
+        return self.store.generation if self.store is not None else 0
+
+    @cached_property
+    def scorer(self):
+        return self.store.scorer()
+
+    def row_of(self, chunk_id: int) -> int | None:
+        return self.store.row_of(chunk_id)
+
+    def rows_for_paths(self, paths: Iterable[str]) -> np.ndarray:
+        return self.store.rows_for_paths(paths)
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def iter_data_files(data_dir: Path = Config.Path.DATA_DIR) -> Iterable[Path]:
+    """Yield every searchable file under the data directory."""
+    for root, _, fnames in os.walk(data_dir):
+        for fname in fnames:
+            if os.path.splitext(fname)[1] in Config.Search.SUFFIXES:
+                yield Path(root) / fname
+
+
+class ChunkIndex:
+    """
+    On-disk index of document chunks and their embeddings.
+    Files are keyed by path, mtime, size and content hash, so only new or
+    changed files are chunked and embedded again on `refresh`. Chunker output
+    is also cached by content hash, so renamed, copied or reverted files are
+    not chunked again.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        chunker,
+        db_path: Path | None = None,
+        data_dir: Path = Config.Path.DATA_DIR,
+        texts: TextStore | None = None,
+    ):
+        self.embedder = embedder
+        self.chunker = chunker
+        self.texts = texts or TextStore()
+        self.data_dir = Path(os.path.normpath(data_dir))
+        self.db_path = db_path or Config.Path.CACHE_DIR / Config.Search.INDEX_FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.store_path = self.db_path.with_name(Config.Search.VECTOR_FILE)
+        self.lock_path = self.db_path.with_name(Config.Search.WRITER_LOCK_FILE)
+        self._writer_fd: int | None = None
+        self._lock = threading.RLock()
+        # serializes writing a generation, so concurrent refreshes publish in commit order
+        self._publish_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.executescript(lexical.SCHEMA)
+        self._snapshot: IndexSnapshot | None = None
+        self._check_settings()
+        self._backfill_lexical()
+
+    def _check_settings(self):
+        """Drop every stored chunk when the embedding model, chunking strategy or an extractor changed."""
+        model = getattr(self.embedder, "model", None) or getattr(self.embedder, "model_name", "")
+        settings = {"model": model, "strategy": self.chunker.name, "extractors": extractors_version()}
+        with self._lock, self._conn:
+            stored = dict(self._conn.execute("SELECT key, value FROM meta"))
+            if all(stored.get(key) == value for key, value in settings.items()):
+                return
+            if stored.get("model") != model or stored.get("extractors") != settings["extractors"]:
+                self._conn.execute("DELETE FROM chunk_cache")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM files")
+            self._conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", settings.items())
+
+    def _cached_chunks(self, digest: str) -> list[Chunk] | None:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT chunks, vectors FROM chunk_cache WHERE sha256 = ? AND strategy = ?",
+                (digest, self.chunker.name),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE chunk_cache SET used = ? WHERE sha256 = ? AND strategy = ?",
+                (time.time(), digest, self.chunker.name),
+            )
+        texts = json.loads(row[0])
+        if row[1] is None:
+            return [Chunk(text) for text in texts]
+        vectors = np.frombuffer(row[1], dtype=np.float32).reshape(len(texts), -1)
+        return [Chunk(text, vector.tolist()) for text, vector in zip(texts, vectors)]
+
+    def _cache_chunks(self, digest: str, chunks: list[Chunk]):
+        """Remember chunker output; callers own the transaction."""
+        vectors = None
+        if chunks and all(chunk.vector is not None for chunk in chunks):
+            vectors = np.asarray([chunk.vector for chunk in chunks], dtype=np.float32).tobytes()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chunk_cache VALUES (?, ?, ?, ?, ?)",
+            (digest, self.chunker.name, json.dumps([chunk.text for chunk in chunks]), vectors, time.time()),
+        )
+
+    def _prune_chunk_cache(self):
+        """Keep entries of indexed files plus the most recently used others; callers own the transaction."""
+        self._conn.execute(
+            """
+            DELETE FROM chunk_cache
+            WHERE sha256 NOT IN (SELECT sha256 FROM files)
+            AND rowid NOT IN (SELECT rowid FROM chunk_cache ORDER BY used DESC LIMIT ?)
+            """,
+            (Config.Chunking.CACHE_ENTRIES,),
+        )
+
+    def _backfill_lexical(self):
+        """Add postings for chunks indexed before the lexical index existed."""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, text FROM chunks WHERE id NOT IN (SELECT chunk_id FROM lexical)"
+            ).fetchall()
+            for chunk_id, text in rows:
+                lexical.index_chunk(self._conn, chunk_id, text)
+
+    def _relpath(self, path: Path) -> str:
+        return str(path.relative_to(self.data_dir))
+
+    def acquire_writer(self) -> bool:
+        """
+        Make this process the writer of the index unless another one already
+        is. The lock is held until `release_writer` or exit, so of the workers
+        serving one index only a single one scans, embeds and publishes
+        generations; the others map what it publishes.
+        """
+        with self._lock:
+            if self._writer_fd is None:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(fd)
+                    return False
+                self._writer_fd = fd
+            return True
+
+    def release_writer(self):
+        """Let another process take over writing the index."""
+        with self._lock:
+            if self._writer_fd is not None:
+                os.close(self._writer_fd)
+                self._writer_fd = None
+
+    def refresh(self, paths: Iterable[Path] | None = None) -> int:
+        """
+        Bring the index up to date with the data directory.
+        When `paths` is given only those files are checked; otherwise the whole
+        directory is scanned and files that disappeared are dropped.
+        Chunking and embedding run without holding the index lock; the result
+        is committed in one transaction and published as a new snapshot, so
+        readers only ever see the previous or the next complete state.
+        Only the writer (see `acquire_writer`) refreshes; in any other process
+        this returns 0 at once.
+        Returns the number of files that were (re)indexed or removed.
+        """
+        if not self.acquire_writer():
+            return 0
+        full_scan = paths is None
+        with metrics.span("index.scan"):
+            if full_scan:
+                paths = list(iter_data_files(self.data_dir))
+            else:
+                # `relative_to` is lexical and would take "data/../x", so normalize first
+                paths = [
+                    path for path in (Path(os.path.normpath(path)) for path in paths)
+                    if path.suffix in Config.Search.SUFFIXES and path.is_relative_to(self.data_dir)
+                ]
+            with self._lock:
+                known = {
+                    path: (mtime, size, sha)
+                    for path, mtime, size, sha in self._conn.execute("SELECT path, mtime, size, sha256 FROM files")
+                }
+            changed: list[tuple[str, float, int, str, Path]] = []
+            touched: list[tuple[float, int, str]] = []
+            removed: list[str] = []
+            seen = set()
+            for path in paths:
+                rel = self._relpath(path)
+                seen.add(rel)
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    if rel in known:
+                        removed.append(rel)
+                    continue
+                entry = known.get(rel)
+                if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+                    continue
+                digest = file_digest(path)
+                if entry and entry[2] == digest:
+                    touched.append((stat.st_mtime, stat.st_size, rel))
+                    continue
+                changed.append((rel, stat.st_mtime, stat.st_size, digest, path))
+            if full_scan:
+                removed.extend(rel for rel in known if rel not in seen)
+
+        cached = {digest: self._cached_chunks(digest) for _, _, _, digest, _ in changed}
+        # one extraction pass for every file the chunk cache cannot serve
+        with metrics.span("index.extract"):
+            texts = self.texts.get_many(
+                [(path, digest) for _, _, _, digest, path in changed if cached[digest] is None], skip_errors=True
+            )
+        # files that could not be parsed keep no row in `files`, so the next scan tries them again
+        changed = [entry for entry in changed if cached[entry[3]] is not None or entry[4] in texts]
+        chunked: list[tuple[list[Chunk], bool]] = []
+        with metrics.span("index.chunk"):
+            for _, _, _, digest, path in changed:
+                chunks = cached[digest]
+                if chunks is None:
+                    chunked.append((self.chunker.chunk(texts[path], path.suffix), True))
+                else:
+                    chunked.append((chunks, False))
+        # only chunks the strategy did not already embed go to the embedder
+        pending = [chunk for chunks, _ in chunked for chunk in chunks if chunk.vector is None]
+        if pending:
+            with metrics.span("index.embed", chunks=len(pending)):
+                for chunk, vector in zip(pending, self.embedder.embed_documents([c.text for c in pending])):
+                    chunk.vector = vector
+
+        with metrics.span("index.commit"), self._lock, self._conn:
+            self._conn.executemany("UPDATE files SET mtime = ?, size = ? WHERE path = ?", touched)
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(rel,) for rel in removed])
+            for (rel, mtime, size, digest, _), (chunks, fresh) in zip(changed, chunked):
+                self._conn.execute("DELETE FROM files WHERE path = ?", (rel,))
+                self._conn.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (rel, mtime, size, digest))
+                if fresh:
+                    self._cache_chunks(digest, chunks)
+                for i, chunk in enumerate(chunks):
+                    cursor = self._conn.execute(
+                        "INSERT INTO chunks (path, ordinal, text, vector) VALUES (?, ?, ?, ?)",
+                        (rel, i, chunk.text, np.asarray(chunk.vector, dtype=np.float32).tobytes()),
+                    )
+                    lexical.index_chunk(self._conn, cursor.lastrowid, chunk.text)
+            if changed or removed:
+                self._prune_chunk_cache()
+        # a store left stale by another format or an interrupted run is rewritten here,
+        # so readers never have to
+        if changed or removed or not self._store_current(read_header(self.store_path)):
+            self._publish()
+        return len(changed) + len(removed)
+
+    def lexical_search(self, query: str, k: int, chunk_ids: set[int] | None = None) -> list[tuple[int, float]]:
+        """BM25 over the stored chunks; no embedding call is made."""
+        with self._lock:
+            return lexical.bm25(self._conn, query, k, chunk_ids)
+
+    def _store_current(self, header: dict | None) -> bool:
+        """Whether the store file holds exactly the committed chunks, in the configured format."""
+        if header is None or header["dtype"] != Config.Search.VECTOR_DTYPE:
+            return False
+        with self._lock:
+            count, last_id = self._conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM chunks").fetchone()
+        # ids only grow, so any insert or delete changes one of the two
+        return (header.get("chunks"), header.get("last_id")) == (count, last_id)
+
+    def _write_store(self):
+        """Write the committed chunks as the next generation of the store file."""
+        # rows read, quantized and written at a time
+        block_rows = 8192
+        # a separate connection reads one consistent state without holding the index lock
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("BEGIN")
+            count, last_id = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM chunks").fetchone()
+            cursor = conn.execute("SELECT id, path, text, vector FROM chunks ORDER BY id")
+            first = cursor.fetchmany(block_rows)
+            dim = len(first[0][3]) // 4 if first else 0
+
+            def blocks():
+                rows = first
+                while rows:
+                    yield (
+                        [row[0] for row in rows],
+                        [row[1] for row in rows],
+                        [row[2] for row in rows],
+                        np.frombuffer(b"".join(row[3] for row in rows), dtype=np.float32).reshape(len(rows), dim),
+                    )
+                    rows = cursor.fetchmany(block_rows)
+
+            previous = read_header(self.store_path) or {}
+            write_store(
+                self.store_path, blocks(), count, dim,
+                generation=previous.get("generation", 0) + 1, chunks=count, last_id=last_id,
+            )
+        finally:
+            conn.close()
+
+    def _swap(self, snapshot: IndexSnapshot):
+        snapshot.scorer
+        with self._lock:
+            if self._snapshot is None or snapshot.generation >= self._snapshot.generation:
+                self._snapshot = snapshot
+
+    def _publish(self):
+        """
+        Write the next generation of the store, map it, then swap it in.
+        Reading the committed chunks, numbering the generation and replacing
+        the file all happen under one lock, so a refresh can never replace a
+        newer generation with an older state; when an earlier publish already
+        covered this refresh's commit, nothing is written.
+        """
+        with self._publish_lock, metrics.span("index.publish"):
+            if not self._store_current(read_header(self.store_path)):
+                self._write_store()
+            self._swap(IndexSnapshot(VectorStore(self.store_path)))
+
+    def snapshot(self) -> IndexSnapshot:
+        """
+        Return the latest snapshot of the chunks and vectors. Only maps the
+        newest generation on disk, including one published by another process
+        serving the same index; writing a generation is left to `refresh`.
+        Empty until the first generation is published.
+        """
+        current = self._snapshot
+        try:
+            stat = self.store_path.stat()
+        except FileNotFoundError:
+            return current or IndexSnapshot(None)
+        if current is not None and current.store is not None:
+            if (stat.st_ino, stat.st_mtime_ns) == current.store.file_id:
+                return current
+        self._swap(IndexSnapshot(VectorStore(self.store_path)))
+        return self._snapshot
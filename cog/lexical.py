@@ -0,0 +1,90 @@
+import heapq
+import math
+import re
+import sqlite3
+from collections import Counter
+
+from cog.config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lexical (
+    chunk_id INTEGER PRIMARY KEY REFERENCES chunks(id) ON DELETE CASCADE,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id INTEGER NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk_id);
+"""
+
+WORD = re.compile(r"[A-Za-z0-9_]+")
+SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased word tokens. Identifiers are kept whole and also split into
+    their snake_case/camelCase parts, so `get_session_history` matches
+    `session` and `getSessionHistory` matches `get session history`.
+    """
+    tokens = []
+    for word in WORD.findall(text):
+        tokens.append(word.lower())
+        parts = SUBWORD.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+def index_chunk(conn: sqlite3.Connection, chunk_id: int, text: str):
+    """Add the postings of one chunk; callers own the transaction."""
+    tokens = tokenize(text)
+    conn.execute("INSERT OR REPLACE INTO lexical VALUES (?, ?)", (chunk_id, len(tokens)))
+    conn.executemany(
+        "INSERT OR REPLACE INTO postings VALUES (?, ?, ?)",
+        [(term, chunk_id, tf) for term, tf in Counter(tokens).items()],
+    )
+
+
+def bm25(
+    conn: sqlite3.Connection,
+    query: str,
+    k: int,
+    chunk_ids: set[int] | None = None,
+    k1: float = Config.Search.BM25_K1,
+    b: float = Config.Search.BM25_B,
+) -> list[tuple[int, float]]:
+    """Return the `k` best `(chunk_id, score)` pairs for `query`, best first."""
+    terms = set(tokenize(query))
+    count, avg_length = conn.execute("SELECT COUNT(*), AVG(length) FROM lexical").fetchone()
+    if not terms or not count:
+        return []
+    avg_length = avg_length or 1.0
+    scores: dict[int, float] = {}
+    for term in terms:
+        rows = conn.execute(
+            "SELECT p.chunk_id, p.tf, l.length FROM postings p JOIN lexical l USING (chunk_id) WHERE p.term = ?",
+            (term,),
+        ).fetchall()
+        if not rows:
+            continue
+        idf = math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+        for chunk_id, tf, length in rows:
+            if chunk_ids is not None and chunk_id not in chunk_ids:
+                continue
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (
+                tf + k1 * (1 - b + b * length / avg_length)
+            )
+    return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = Config.Search.RRF_K) -> list[tuple[int, float]]:
+    """Fuse several best-first rankings of ids into one, best first."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,188 @@
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from langchain_core.messages import BaseMessage, HumanMessage, messages_from_dict, messages_to_dict
+
+from cog.config import Config
+
+SCHEMA = """
+PRAGMA foreign_keys = ON;
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    -- last message folded into the summary
+    summarized_upto INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    calls = json.dumps(getattr(message, "tool_calls", None) or [])
+    return (len(content) + len(calls)) // Config.Summary.CHARS_PER_TOKEN + 4
+
+
+@dataclass
+class StoredMessage:
+    seq: int
+    message: BaseMessage
+    tokens: int
+
+
+class SessionStore:
+    """
+    Conversation history per session on SQLite.
+    Each session keeps its messages plus a rolling summary of the ones that
+    no longer fit the context; sessions idle for longer than `ttl` seconds
+    are deleted.
+    """
+
+    def __init__(self, db_path: Path | None = None, ttl: float = Config.Memory.TTL_SECONDS):
+        self.db_path = db_path or Config.Path.CACHE_DIR / Config.Memory.FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+
+    def append(self, session_id: str, messages: list[BaseMessage]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, updated) VALUES (?, ?)"
+                " ON CONFLICT (session_id) DO UPDATE SET updated = excluded.updated",
+                (session_id, now),
+            )
+            last = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?)",
+                [
+                    (session_id, last + i, json.dumps(data), estimate_tokens(message))
+                    for i, (message, data) in enumerate(zip(messages, messages_to_dict(messages)), start=1)
+                ],
+            )
+
+    def messages(self, session_id: str, after: int = 0) -> list[StoredMessage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, message, tokens FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, after),
+            ).fetchall()
+        decoded = messages_from_dict([json.loads(data) for _, data, _ in rows])
+        return [StoredMessage(seq, message, tokens) for (seq, _, tokens), message in zip(rows, decoded)]
+
+    def summary(self, session_id: str) -> tuple[str, int]:
+        """The rolling summary and the last message it covers."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, summarized_upto FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row or ("", 0)
+
+    def set_summary(self, session_id: str, summary: str, upto: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, summarized_upto = ? WHERE session_id = ?",
+                (summary, upto, session_id),
+            )
+
+    def prune(self, session_id: str, upto: int, keep: int = Config.Memory.MAX_STORED_MESSAGES):
+        """Drop summarized messages beyond the newest `keep` of a session."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                DELETE FROM messages WHERE session_id = ? AND seq <= ? AND seq NOT IN
+                    (SELECT seq FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?)
+                """,
+                (session_id, upto, session_id, keep),
+            )
+
+    def evict_idle(self) -> int:
+        """Delete sessions untouched for `ttl` seconds; returns how many."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,)
+            ).rowcount
+
+
+def is_dialogue(message: BaseMessage) -> bool:
+    """User questions and final answers; tool calls and results only reach the summary."""
+    return message.type == "human" or (message.type == "ai" and not getattr(message, "tool_calls", None))
+
+
+def recent_turns(messages: list[StoredMessage], budget: int) -> list[StoredMessage]:
+    """
+    The newest whole turns (a human message and everything after it) that fit
+    in `budget` tokens, so tool calls are never separated from their results.
+    """
+    kept: list[StoredMessage] = []
+    turn: list[StoredMessage] = []
+    used = 0
+    for stored in reversed(messages):
+        turn.insert(0, stored)
+        if isinstance(stored.message, HumanMessage):
+            cost = sum(m.tokens for m in turn)
+            if used + cost > budget:
+                break
+            kept[:0] = turn
+            used += cost
+            turn = []
+    return kept
+
+
+class ContextBuilder:
+    """
+    Builds the history sent with each turn: the rolling summary followed by
+    the questions and answers of the most recent turns verbatim, within a
+    fixed token budget. Turns that fall out of the budget, tool traffic
+    included, are folded into the summary by `summarize(summary, messages)`,
+    so the prompt stays the same size however long a session runs.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        summarize: Callable[[str, list[BaseMessage]], Awaitable[str]],
+        history_tokens: int = Config.Memory.HISTORY_TOKENS,
+    ):
+        self.store = store
+        self.summarize = summarize
+        self.history_tokens = history_tokens
+
+    def _split(self, session_id: str) -> tuple[str, list[StoredMessage], list[StoredMessage]]:
+        """The summary, the messages not yet in it but outside the verbatim window, and the window."""
+        summary, upto = self.store.summary(session_id)
+        pending = self.store.messages(session_id, after=upto)
+        recent = recent_turns([m for m in pending if is_dialogue(m.message)], self.history_tokens)
+        cutoff = recent[0].seq if recent else float("inf")
+        return summary, [m for m in pending if m.seq < cutoff], recent
+
+    async def compact(self, session_id: str):
+        """Fold every message older than the verbatim window into the summary."""
+        summary, older, _ = self._split(session_id)
+        if older:
+            summary = await self.summarize(summary, [m.message for m in older])
+            self.store.set_summary(session_id, summary, older[-1].seq)
+            self.store.prune(session_id, older[-1].seq)
+
+    def build(self, session_id: str) -> tuple[str, list[BaseMessage]]:
+        """The summary and the verbatim messages for the next turn."""
+        summary, _, recent = self._split(session_id)
+        return summary, [m.message for m in recent]
@@ -0,0 +1,236 @@
+import asyncio
+import bisect
+import functools
+import inspect
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager, nullcontext
+
+from cog.config import Config
+
+# label values in a fixed order, so each series has one hashable key
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus model."""
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> (bucket counts, sum, count)
+        self._series: dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format(key + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format(key)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        lines.extend(f"{self.name}{_format(key)} {value:g}" for key, value in sorted(values.items()))
+        return lines
+
+
+def _format(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+SPAN_SECONDS = Histogram(
+    "cog_span_seconds", "Duration of tool calls and pipeline stages.", Config.Metrics.LATENCY_BUCKETS
+)
+SPAN_ERRORS = Counter("cog_span_errors_total", "Tool calls and pipeline stages that raised.")
+SIZES = Histogram("cog_batch_size", "Items per batch, e.g. texts per embedding request.", Config.Metrics.SIZE_BUCKETS)
+TOKENS = Counter("cog_llm_tokens_total", "Tokens sent to and generated by chat models.")
+
+# name -> callable returning {stat: number}, e.g. a cache's stats()
+_gauges: dict[str, Callable[[], dict]] = {}
+# live event subscribers: (loop, queue)
+_subscribers: list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+_subscribers_lock = threading.Lock()
+
+
+def publish(event: dict):
+    """Hand an event to every `/events` subscriber; dropped for subscribers that fall behind."""
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for loop, queue in subscribers:
+        loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def _offer(queue: asyncio.Queue, event: dict):
+    if not queue.full():
+        queue.put_nowait(event)
+
+
+@contextmanager
+def _span(name: str, attributes: dict):
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        SPAN_ERRORS.inc(span=name)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        SPAN_SECONDS.observe(seconds, span=name)
+        if _subscribers:
+            publish({"type": "span", "name": name, "seconds": seconds, "status": status, "time": time.time(), **attributes})
+
+
+_disabled = nullcontext()
+
+
+def span(name: str, **attributes):
+    """Time a block as a span; a shared no-op when metrics are disabled."""
+    if not Config.Metrics.ENABLED:
+        return _disabled
+    return _span(name, attributes)
+
+
+def traced(name: str):
+    """Decorator form of `span`, for sync and async functions alike."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_size(name: str, size: int):
+    if Config.Metrics.ENABLED:
+        SIZES.observe(size, batch=name)
+
+
+def count_tokens(model: str, input_tokens: int, output_tokens: int):
+    if Config.Metrics.ENABLED:
+        TOKENS.inc(input_tokens, model=model, kind="input")
+        TOKENS.inc(output_tokens, model=model, kind="output")
+        if _subscribers:
+            publish({"type": "llm", "model": model, "input_tokens": input_tokens,
+                     "output_tokens": output_tokens, "time": time.time()})
+
+
+def register_stats(name: str, stats: Callable[[], dict]):
+    """Expose the numeric values of `stats()` as gauges named `cog_<name>_<key>`."""
+    _gauges[name] = stats
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = [*SPAN_SECONDS.render(), *SPAN_ERRORS.render(), *SIZES.render(), *TOKENS.render()]
+    for name, stats in sorted(_gauges.items()):
+        try:
+            values = stats()
+        except Exception:
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE cog_{name}_{key} gauge")
+                lines.append(f"cog_{name}_{key} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def subscription(maxsize: int = Config.Metrics.EVENT_QUEUE):
+    """A queue receiving live events for as long as the block runs."""
+    entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize))
+    with _subscribers_lock:
+        _subscribers.append(entry)
+    try:
+        yield entry[1]
+    finally:
+        with _subscribers_lock:
+            _subscribers.remove(entry)
+
+
+def chat_callback():
+    """LangChain callback recording the latency and token usage of chat model calls."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class ChatMetrics(BaseCallbackHandler):
+        def __init__(self):
+            self._started: dict = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            started = self._started.pop(run_id, None)
+            if not Config.Metrics.ENABLED:
+                return
+            model = ""
+            input_tokens = output_tokens = 0
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    usage = getattr(message, "usage_metadata", None) or {}
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+                    model = model or (getattr(message, "response_metadata", None) or {}).get("model", "")
+            if started is not None:
+                SPAN_SECONDS.observe(time.perf_counter() - started, span="llm.chat")
+            count_tokens(model, input_tokens, output_tokens)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._started.pop(run_id, None)
+            if Config.Metrics.ENABLED:
+                SPAN_ERRORS.inc(span="llm.chat")
+
+    return ChatMetrics()
@@ -1,16 +1,137 @@
-from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_ollama import ChatOllama
+import logging
+import threading
+from typing import TYPE_CHECKING
 
-from cog.config import Config, ModelConfig, ModelProvider
+from cog import metrics
+from cog.concurrency import cached_factory
+from cog.config import Config, EmbeddingConfig, ModelConfig, ModelProvider, embedding_config
 
-def create_llm(model_config: ModelConfig) -> BaseChatModel:
-    """Create a language model instance based on the provided configuration."""
+if TYPE_CHECKING:
+    import httpx
+    import ollama
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    from cog.embedding_cache import CachedEmbeddings
+    from cog.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+@cached_factory
+def _transports(
+    base_url: str, model: str, max_concurrency: int
+) -> tuple["httpx.HTTPTransport", "httpx.AsyncHTTPTransport"]:
+    """
+    Pooled sync/async transports shared by every client of `model` on
+    `base_url`, so connections are reused across callers while each model
+    gets its own `max_concurrency` connections.
+    """
+    import httpx
+
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    return httpx.HTTPTransport(limits=limits), httpx.AsyncHTTPTransport(limits=limits)
+
+
+@cached_factory
+def ollama_client(model_config: ModelConfig) -> "ollama.Client":
+    """Plain Ollama client on the shared transport, for calls outside LangChain."""
+    import ollama
+
+    transport, _ = _transports(model_config.base_url, model_config.name, model_config.max_concurrency)
+    return ollama.Client(host=model_config.base_url, transport=transport)
+
+
+def create_embeddings(config: EmbeddingConfig) -> "CachedEmbeddings":
+    """Remote embedding client behind the persistent embedding cache."""
+    from cog.embedding_cache import CachedEmbeddings
+    from cog.remote_embedder import RemoteOllamaEmbeddings
+
+    return CachedEmbeddings(RemoteOllamaEmbeddings(
+        endpoint=config.endpoint,
+        model=config.model,
+        batch_size=config.batch_size,
+        max_workers=config.max_workers,
+        timeout=config.timeout,
+        max_retries=config.max_retries,
+    ))
+
+
+@cached_factory
+def get_response_cache() -> "ResponseCache":
+    """Process-wide response cache shared by every chat model."""
+    from cog.response_cache import ResponseCache
+
+    threshold = Config.ResponseCache.SIMILARITY_THRESHOLD
+    cache = ResponseCache(embedder=create_embeddings(embedding_config) if threshold is not None else None)
+    metrics.register_stats("response_cache", cache.stats)
+    return cache
+
+
+@cached_factory
+def create_llm(model_config: ModelConfig) -> "BaseChatModel":
+    """
+    Create a language model instance based on the provided configuration.
+    This is a process-wide registry: one client per configuration, all clients
+    of a model share pooled transports, and the client library is only
+    imported on the first call.
+    """
     if model_config.provider == ModelProvider.OLLAMA:
-        return ChatOllama(
+        from langchain_ollama import ChatOllama
+
+        transport, async_transport = _transports(model_config.base_url, model_config.name, model_config.max_concurrency)
+        llm = ChatOllama(
             model=model_config.name,
             temperature=model_config.temperature,
-            num_ctx=Config.OLLAMA_CONTEXT_WINDOW,
-            base_url= model_config.base_url,         
+            num_ctx=model_config.num_ctx or Config.OLLAMA_CONTEXT_WINDOW,
+            keep_alive=model_config.keep_alive,
+            base_url= model_config.base_url,
+            sync_client_kwargs={"transport": transport},
+            async_client_kwargs={"transport": async_transport},
+            cache=get_response_cache() if model_config.cache and Config.ResponseCache.ENABLED else False,
+            callbacks=[metrics.chat_callback()] if Config.Metrics.ENABLED else None,
         )
+        if model_config.warm_up:
+            threading.Thread(target=warm_up, args=(model_config,), daemon=True).start()
+        return llm
     else:
-        raise ValueError(f"Unsupported model provider: {model_config.provider}")
\ No newline at end of file
+        raise ValueError(f"Unsupported model provider: {model_config.provider}")
+
+
+def warm_up(model_config: ModelConfig) -> bool:
+    """
+    Ask Ollama to load the model (an empty generate request) and keep it
+    resident for `keep_alive`, so the first real request skips the load.
+    """
+    try:
+        ollama_client(model_config).generate(model=model_config.name, keep_alive=model_config.keep_alive)
+        return True
+    except Exception as e:
+        logger.warning("Warm-up of %s failed: %s", model_config.name, e)
+        return False
+
+
+class KeepAlive:
+    """Background pinger that re-warms a model before Ollama unloads it."""
+
+    def __init__(self, model_config: ModelConfig, interval: float = Config.Models.KEEP_ALIVE_INTERVAL):
+        self.model_config = model_config
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="keep-alive", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            warm_up(self.model_config)
+            if self._stop.wait(self.interval):
+                return
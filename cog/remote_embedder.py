@@ -1,18 +1,139 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 import requests
-from langchain.embeddings.base import Embeddings
+from langchain_core.embeddings import Embeddings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cog import metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 
 class RemoteOllamaEmbeddings(Embeddings):
-    def __init__(self, endpoint: str, model: str):
+    """
+    Embeddings served by a remote Ollama-compatible `/api/embeddings` endpoint.
+    Inputs are split into batches of `batch_size` texts that are sent
+    concurrently (at most `max_workers` in flight) over one pooled keep-alive
+    session; transient failures are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        model: str,
+        batch_size: int = 64,
+        max_workers: int = 4,
+        timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+    ):
         self.endpoint = endpoint
         self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
 
-    def embed_documents(self, texts):
-        response = requests.post(
-            f"{self.endpoint}/api/embeddings",
-            json={"model": self.model, "input": texts}
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_workers,
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=backoff,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=None,  # embedding requests are idempotent
+                raise_on_status=False,
+            ),
         )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+        self._async_client: httpx.AsyncClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.endpoint}/api/embeddings"
+
+    def _batches(self, texts: list[str]) -> list[list[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="embed")
+            return self._executor
+
+    def _post(self, batch: list[str]) -> list[list[float]]:
+        metrics.observe_size("embed", len(batch))
+        with metrics.span("embed.request"):
+            response = self._session.post(
+                self.url, json={"model": self.model, "input": batch}, timeout=self.timeout
+            )
         response.raise_for_status()
         return response.json()["data"]
 
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        batches = self._batches(texts)
+        if len(batches) == 1:
+            return self._post(batches[0])
+        return [vector for result in self._pool().map(self._post, batches) for vector in result]
+
     def embed_query(self, text):
-        return self.embed_documents([text])[0]
\ No newline at end of file
+        return self.embed_documents([text])[0]
+
+    def _client(self) -> httpx.AsyncClient:
+        """One pooled async client per event loop; clients cannot cross loops."""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_workers, max_keepalive_connections=self.max_workers),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def _apost(self, batch: list[str], semaphore: asyncio.Semaphore) -> list[list[float]]:
+        metrics.observe_size("embed", len(batch))
+        async with semaphore:
+            with metrics.span("embed.request"):
+                for attempt in range(self.max_retries + 1):
+                    last = attempt == self.max_retries
+                    try:
+                        response = await self._client().post(
+                            self.url, json={"model": self.model, "input": batch}
+                        )
+                    except httpx.TransportError:
+                        if last:
+                            raise
+                    else:
+                        if last or response.status_code not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            return response.json()["data"]
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def aembed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        semaphore = asyncio.Semaphore(self.max_workers)
+        results = await asyncio.gather(*(self._apost(batch, semaphore) for batch in self._batches(texts)))
+        return [vector for result in results for vector in result]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+    def close(self):
+        self._session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumps, loads
+
+from cog.config import Config
+from cog.index import iter_data_files
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    llm_string TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    response TEXT NOT NULL,
+    vector BLOB,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_llm ON responses (llm_string, data_version);
+"""
+
+# query vectors computed by a missed lookup, kept until the matching update
+PENDING_VECTORS = 64
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Canonical form of a serialized chat prompt: case and whitespace
+    differences in message contents do not change the answer, while roles,
+    tool calls and tool call ids still do.
+    """
+    try:
+        messages = json.loads(prompt)
+        for message in messages:
+            content = message["kwargs"].get("content")
+            if isinstance(content, str):
+                message["kwargs"]["content"] = _normalize_text(content)
+        return json.dumps(messages, sort_keys=True)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return _normalize_text(prompt)
+
+
+def prompt_text(prompt: str) -> str:
+    """The message contents of a serialized chat prompt, for embedding."""
+    try:
+        messages = json.loads(prompt)
+        return "\n".join(str(m["kwargs"]["content"]) for m in messages)
+    except (ValueError, TypeError, KeyError):
+        return prompt
+
+
+def data_fingerprint(data_dir: Path = Config.Path.DATA_DIR) -> str:
+    """Digest of every data file's path, mtime and size."""
+    digest = hashlib.sha256()
+    for path in sorted(iter_data_files(data_dir)):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        digest.update(f"{path.relative_to(data_dir)}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode())
+    return digest.hexdigest()
+
+
+class ResponseCache(BaseCache):
+    """
+    LangChain LLM cache for chat model responses.
+    Entries are keyed by the normalized prompt plus the model's configuration
+    string and tagged with a fingerprint of the data directory, so any file
+    change invalidates them. With an `embedder` and a `similarity_threshold`,
+    an exact miss falls back to the most similar cached prompt of the same
+    model. Hot entries live in an in-memory LRU; all entries persist to SQLite
+    and the least recently used are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings | None = None,
+        similarity_threshold: float | None = Config.ResponseCache.SIMILARITY_THRESHOLD,
+        max_entries: int = Config.ResponseCache.MAX_ENTRIES,
+        memory_entries: int = Config.ResponseCache.MEMORY_ENTRIES,
+        data_dir: Path = Config.Path.DATA_DIR,
+        check_interval: float = Config.ResponseCache.DATA_CHECK_SECONDS,
+        db_path: Path | None = None,
+    ):
+        self.embedder = embedder if similarity_threshold is not None else None
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self.db_path = db_path or Config.Path.CACHE_DIR / Config.ResponseCache.FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        self._lru: OrderedDict[str, RETURN_VAL_TYPE] = OrderedDict()
+        # llm_string -> (keys, normalized vectors) of the current data version
+        self._vectors: dict[str, tuple[list[str], np.ndarray]] = {}
+        self._pending: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._data_version = ""
+        self._checked_at = 0.0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+            "memory_entries": len(self._lru),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{normalize_prompt(prompt)}\0{llm_string}".encode()).hexdigest()
+
+    def _current_version(self) -> str:
+        """Re-fingerprint the data directory at most every `check_interval` seconds; callers hold the lock."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval or not self._data_version:
+            self._checked_at = now
+            version = data_fingerprint(self.data_dir)
+            if version != self._data_version:
+                if self._data_version:
+                    self.invalidations += 1
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE data_version != ?", (version,))
+                self._lru.clear()
+                self._vectors.clear()
+                self._data_version = version
+        return self._data_version
+
+    def _remember(self, key: str, value: RETURN_VAL_TYPE):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_entries:
+            self._lru.popitem(last=False)
+
+    def _load(self, key: str, version: str) -> RETURN_VAL_TYPE | None:
+        value = self._lru.get(key)
+        if value is not None:
+            self._lru.move_to_end(key)
+        else:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND data_version = ?", (key, version)
+            ).fetchone()
+            if row is None:
+                return None
+            try:
+                value = [loads(generation) for generation in json.loads(row[0])]
+            except Exception:
+                return None
+            self._remember(key, value)
+        with self._conn:
+            self._conn.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+        return value
+
+    def _similar(self, llm_string: str, version: str, vector: np.ndarray) -> str | None:
+        """Key of the closest cached prompt for the same model, if it clears the threshold."""
+        if llm_string not in self._vectors:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM responses WHERE llm_string = ? AND data_version = ? AND vector IS NOT NULL",
+                (llm_string, version),
+            ).fetchall()
+            matrix = np.array([np.frombuffer(blob, dtype=np.float32) for _, blob in rows], dtype=np.float32)
+            self._vectors[llm_string] = ([key for key, _ in rows], matrix)
+        keys, matrix = self._vectors[llm_string]
+        if not keys:
+            return None
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.similarity_threshold else None
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.embed_query(prompt_text(prompt)), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = self.key(prompt, llm_string)
+        with self._lock:
+            version = self._current_version()
+            value = self._load(key, version)
+        if value is not None:
+            self.exact_hits += 1
+            return value
+        if self.embedder is not None:
+            # embedded outside the lock; the remote call can take a while
+            vector = self._embed(prompt)
+            with self._lock:
+                similar = self._similar(llm_string, version, vector)
+                value = self._load(similar, version) if similar else None
+                if value is None:
+                    self._pending[key] = vector
+                    while len(self._pending) > PENDING_VECTORS:
+                        self._pending.popitem(last=False)
+            if value is not None:
+                self.semantic_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self.key(prompt, llm_string)
+        with self._lock:
+            vector = self._pending.pop(key, None)
+        if vector is None and self.embedder is not None:
+            vector = self._embed(prompt)
+        response = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            version = self._current_version()
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, llm_string, version, response, None if vector is None else vector.tobytes(), time.time()),
+                )
+                evicted = self._conn.execute(
+                    """
+                    DELETE FROM responses WHERE key NOT IN
+                        (SELECT key FROM responses ORDER BY used DESC LIMIT ?)
+                    RETURNING key
+                    """,
+                    (self.max_entries,),
+                ).fetchall()
+            for (old,) in evicted:
+                self._lru.pop(old, None)
+            self.evictions += len(evicted)
+            self._remember(key, return_val)
+            known = self._vectors.get(llm_string)
+            if evicted or (known and key in known[0]):
+                self._vectors.clear()
+            elif known is not None and vector is not None:
+                self._vectors[llm_string] = (known[0] + [key], np.vstack([known[1].reshape(-1, vector.size), vector]))
+
+    def clear(self, **kwargs) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._lru.clear()
+            self._vectors.clear()
+            self._pending.clear()
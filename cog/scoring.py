@@ -0,0 +1,66 @@
+import numpy as np
+
+from cog.config import Config
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place and return the matrix as contiguous float32."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.size:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+    return vectors
+
+
+class VectorScorer:
+    """
+    Cosine top-k over one contiguous matrix of pre-normalized float32 vectors.
+    Small corpora are scored exactly with a single matrix-vector product;
+    above `Config.Search.FAISS_THRESHOLD` rows an HNSW index answers instead.
+    """
+
+    def __init__(self, vectors: np.ndarray, faiss_threshold: int = Config.Search.FAISS_THRESHOLD):
+        self.vectors = vectors
+        self._ann = None
+        if len(vectors) >= faiss_threshold > 0:
+            import faiss
+
+            self._ann = faiss.IndexHNSWFlat(vectors.shape[1], Config.Search.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self._ann.hnsw.efSearch = Config.Search.HNSW_EF_SEARCH
+            self._ann.add(vectors)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def top_k(
+        self,
+        query: np.ndarray,
+        k: int,
+        min_score: float = -1.0,
+        rows: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return `(rows, scores)` of the `k` best matches, best first.
+        `rows` restricts scoring to a subset of the matrix, which is always scored exactly.
+        """
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if k <= 0 or not len(self.vectors):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self._ann is not None and rows is None:
+            scores, found = self._ann.search(query.reshape(1, -1), min(k, len(self.vectors)))
+            scores, found = scores[0], found[0]
+            keep = (found >= 0) & (scores >= min_score)
+            return found[keep].astype(np.int64), scores[keep]
+
+        candidates = self.vectors if rows is None else self.vectors[rows]
+        scores = candidates @ query
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        best = best[scores[best] >= min_score]
+        found = best if rows is None else np.asarray(rows)[best]
+        return found.astype(np.int64), scores[best]
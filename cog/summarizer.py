@@ -0,0 +1,134 @@
+import asyncio
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from cog.config import Config
+from cog.extractors import TextStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    sha256 TEXT NOT NULL,
+    model TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (sha256, model)
+) WITHOUT ROWID;
+"""
+
+
+def response_text(response) -> str:
+    """Flatten a chat model response to plain text without any <tags>."""
+    content = response.content
+    if isinstance(content, list):
+        content = " ".join(str(item) for item in content)
+    else:
+        content = str(content)
+    return re.sub(r"<[^>]*>", "", content).strip()
+
+
+class Summarizer:
+    """
+    Map-reduce summarization that fits the model's context window.
+    Text is split into token-bounded chunks, the chunks are summarized in
+    parallel (at most `max_concurrency` requests in flight), and the partial
+    summaries are combined until a single summary remains. Results are cached
+    on disk by file content hash and model name.
+    """
+
+    def __init__(
+        self,
+        model: BaseChatModel,
+        model_name: str,
+        prompt: str,
+        combine_prompt: str,
+        chunk_tokens: int = Config.Summary.CHUNK_TOKENS,
+        max_concurrency: int = Config.Summary.MAX_CONCURRENCY,
+        db_path: Path | None = None,
+        texts: TextStore | None = None,
+    ):
+        self.texts = texts or TextStore()
+        self.model = model
+        self.model_name = model_name
+        self.prompt = prompt
+        self.combine_prompt = combine_prompt
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        # token budgets are converted to characters so that piece lengths stay additive
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens * Config.Summary.CHARS_PER_TOKEN,
+            chunk_overlap=Config.Summary.CHUNK_OVERLAP_TOKENS * Config.Summary.CHARS_PER_TOKEN,
+        )
+        self.db_path = db_path or Config.Path.CACHE_DIR / Config.Summary.CACHE_FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def cached(self, digest: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE sha256 = ? AND model = ?", (digest, self.model_name)
+            ).fetchone()
+        return row[0] if row else None
+
+    def store(self, digest: str, summary: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)", (digest, self.model_name, summary)
+            )
+
+    def _map(self, prompt: str, texts: list[str]) -> list[str]:
+        responses = self.model.batch(
+            [prompt.format(text=text) for text in texts],
+            config={"max_concurrency": self.max_concurrency},
+        )
+        return [response_text(response) for response in responses]
+
+    async def _amap(self, prompt: str, texts: list[str]) -> list[str]:
+        responses = await self.model.abatch(
+            [prompt.format(text=text) for text in texts],
+            config={"max_concurrency": self.max_concurrency},
+        )
+        return [response_text(response) for response in responses]
+
+    def _groups(self, summaries: list[str]) -> list[str]:
+        """Pack partial summaries into context-sized groups for the next combine round."""
+        groups = self.splitter.split_text("\n\n".join(summaries))
+        if len(groups) >= len(summaries):
+            groups = ["\n\n".join(summaries)]
+        return groups
+
+    def summarize(self, text: str) -> str:
+        summaries = self._map(self.prompt, self.splitter.split_text(text) or [text])
+        # combine partial summaries in context-sized groups until one is left
+        while len(summaries) > 1:
+            summaries = self._map(self.combine_prompt, self._groups(summaries))
+        return summaries[0]
+
+    async def asummarize(self, text: str) -> str:
+        summaries = await self._amap(self.prompt, self.splitter.split_text(text) or [text])
+        while len(summaries) > 1:
+            summaries = await self._amap(self.combine_prompt, self._groups(summaries))
+        return summaries[0]
+
+    def summarize_file(self, path: Path) -> str:
+        digest = self.texts.digest(path)
+        summary = self.cached(digest)
+        if summary is None:
+            summary = self.summarize(self.texts.get(path, digest))
+            self.store(digest, summary)
+        return summary
+
+    async def asummarize_file(self, path: Path) -> str:
+        digest = await asyncio.to_thread(self.texts.digest, path)
+        # the summary cache is SQLite behind a lock, like the rest of this method's file I/O
+        summary = await asyncio.to_thread(self.cached, digest)
+        if summary is None:
+            text = await asyncio.to_thread(self.texts.get, path, digest)
+            summary = await self.asummarize(text)
+            await asyncio.to_thread(self.store, digest, summary)
+        return summary
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from cog.config import Config
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+SERVER_NAME = "documents"
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent / "server.py"
+
+
+def connection() -> dict:
+    """Talk to a running server at `MCP_URL`, or spawn `server.py` over stdio."""
+    if Config.Server.Agent.MCP_URL:
+        return {"transport": "streamable_http", "url": Config.Server.Agent.MCP_URL}
+    return {
+        "transport": "stdio",
+        "command": sys.executable,
+        "args": [str(SERVER_SCRIPT)],
+        # the default stdio environment drops OLLAMA_* and CACHE_DIR overrides
+        "env": dict(os.environ),
+        "cwd": str(SERVER_SCRIPT.parent),
+    }
+
+
+class MCPToolSession:
+    """
+    One long-lived MCP session shared by every agent turn.
+    The session is opened and closed by a dedicated task, as the transport's
+    task groups require, and reopened on the next call if it dies.
+    """
+
+    def __init__(self, connection: dict):
+        self.connection = connection
+        self._tools: list["BaseTool"] = []
+        self._task: asyncio.Task | None = None
+        self._ready: asyncio.Event | None = None
+        self._closed: asyncio.Event | None = None
+        self._lock = asyncio.Lock()
+        self._error: BaseException | None = None
+
+    async def _hold(self):
+        from langchain_mcp_adapters.client import MultiServerMCPClient
+        from langchain_mcp_adapters.tools import load_mcp_tools
+
+        client = MultiServerMCPClient({SERVER_NAME: self.connection})
+        try:
+            async with client.session(SERVER_NAME) as session:
+                self._tools = await load_mcp_tools(session)
+                self._ready.set()
+                await self._closed.wait()
+        except BaseException as e:
+            self._error = e
+            logger.warning("MCP session closed: %s", e)
+            raise
+        finally:
+            self._tools = []
+            self._ready.set()
+
+    async def tools(self) -> list["BaseTool"]:
+        """The server's tools, bound to the shared session."""
+        async with self._lock:
+            if self._task is None or self._task.done():
+                self._error = None
+                self._ready = asyncio.Event()
+                self._closed = asyncio.Event()
+                self._task = asyncio.create_task(self._hold(), name="mcp-session")
+                await self._ready.wait()
+                if self._error is not None:
+                    raise RuntimeError(f"Could not connect to the MCP server: {self._error}") from self._error
+            return self._tools
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._closed.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
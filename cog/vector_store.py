@@ -0,0 +1,331 @@
+import json
+import mmap
+import os
+import tempfile
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+
+from cog.config import Config
+from cog.scoring import VectorScorer, normalize_rows
+
+MAGIC = b"COGVEC\x00\x01"
+# the JSON header is padded to this, so every section starts page-aligned
+HEADER_SIZE = 4096
+ALIGN = 64
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# one block of rows from the index: (ids, paths, texts, float32 vectors)
+Block = tuple[list[int], list[str], list[str], np.ndarray]
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """`(stored rows, per-row scales)`; int8 rows are scaled so their largest component is ±127."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    return vectors.astype(DTYPES[dtype]), None
+
+
+def write_store(
+    path: Path,
+    blocks: Iterable[Block],
+    count: int,
+    dim: int,
+    dtype: str = Config.Search.VECTOR_DTYPE,
+    rescore: bool = Config.Search.RESCORE_CANDIDATES > 0,
+    generation: int = 0,
+    **info,
+):
+    """
+    Write one generation of the vector store and atomically replace `path`
+    with it. Rows are streamed block by block, so the writer never holds the
+    whole matrix; processes that mapped the previous file keep reading it
+    until they switch.
+    """
+    full = rescore and dtype != "float32"
+    sizes = {
+        "ids": count * 8,
+        "path_index": count * 4,
+        "text_offsets": (count + 1) * 8,
+        "scales": count * 4 if dtype == "int8" else 0,
+        "vectors": count * dim * np.dtype(DTYPES[dtype]).itemsize,
+        "full": count * dim * 4 if full else 0,
+    }
+    sections: dict[str, list[int]] = {}
+    offset = HEADER_SIZE
+    for name, size in sizes.items():
+        sections[name] = [offset, size]
+        offset = _align(offset + size)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            paths: dict[str, int] = {}
+            texts_start = offset
+            text_offset = 0
+            row = 0
+            for ids, block_paths, texts, vectors in blocks:
+                n = len(ids)
+                if not n:
+                    continue
+                encoded = [text.encode("utf-8") for text in texts]
+                ends = text_offset + np.cumsum([len(text) for text in encoded], dtype=np.uint64)
+                columns = {
+                    "ids": np.asarray(ids, dtype=np.int64),
+                    "path_index": np.fromiter(
+                        (paths.setdefault(p, len(paths)) for p in block_paths), dtype=np.uint32, count=n
+                    ),
+                    # entry i + 1 is where text i ends; entry 0 is written once below
+                    "text_offsets": ends,
+                }
+                vectors = normalize_rows(np.array(vectors, dtype=np.float32))
+                stored, scales = quantize(vectors, dtype)
+                columns["vectors"] = stored
+                if scales is not None:
+                    columns["scales"] = scales
+                if full:
+                    columns["full"] = vectors
+                for name, values in columns.items():
+                    shift = 1 if name == "text_offsets" else 0
+                    f.seek(sections[name][0] + (row + shift) * (values.nbytes // n))
+                    f.write(values.tobytes())
+                f.seek(texts_start + text_offset)
+                f.write(b"".join(encoded))
+                text_offset = int(ends[-1])
+                row += n
+            if row != count:
+                raise ValueError(f"expected {count} rows, got {row}")
+            f.seek(sections["text_offsets"][0])
+            f.write(np.zeros(1, dtype=np.uint64).tobytes())
+            sections["texts"] = [texts_start, text_offset]
+            path_table = json.dumps(list(paths)).encode()
+            sections["paths"] = [_align(texts_start + text_offset), len(path_table)]
+            f.seek(sections["paths"][0])
+            f.write(path_table)
+
+            header = json.dumps({
+                "dtype": dtype, "dim": dim, "count": count, "generation": generation,
+                "sections": sections, **info,
+            }).encode()
+            if len(MAGIC) + 4 + len(header) > HEADER_SIZE:
+                raise ValueError("vector store header too large")
+            f.seek(0)
+            f.write(MAGIC + len(header).to_bytes(4, "little") + header)
+            f.flush()
+            os.fsync(f.fileno())
+            # mkstemp creates the file private to this user; workers may run as others
+            os.fchmod(f.fileno(), 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _parse_header(head: bytes) -> dict | None:
+    if len(head) < len(MAGIC) + 4 or not head.startswith(MAGIC):
+        return None
+    size = int.from_bytes(head[len(MAGIC):len(MAGIC) + 4], "little")
+    return json.loads(head[len(MAGIC) + 4:len(MAGIC) + 4 + size])
+
+
+def read_header(path: Path) -> dict | None:
+    """The header of the store at `path`, or None when there is no valid store."""
+    try:
+        with open(path, "rb") as f:
+            return _parse_header(f.read(HEADER_SIZE))
+    except FileNotFoundError:
+        return None
+
+
+class Texts(Sequence[str]):
+    """Chunk texts decoded on access from the mapped text section."""
+
+    def __init__(self, blob: memoryview, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return str(self._blob[start:end], "utf-8")
+
+
+class Paths(Sequence[str]):
+    """The source path of every chunk, through the path table."""
+
+    def __init__(self, table: list[str], index: np.ndarray):
+        self.table = table
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.table[i] for i in self._index[row]]
+        return self.table[self._index[row]]
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.table[i] for i in self._index)
+
+
+class VectorStore:
+    """
+    One generation of the chunk vectors and their metadata, memory-mapped
+    read-only from a single file, so worker processes serving the same index
+    share its pages instead of each holding a copy.
+
+    Vectors are stored L2-normalized as float32, float16 or int8 (with a
+    per-row scale). Quantized stores also keep a float32 copy that is only
+    read for the top candidates, to re-score them exactly.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        # kept open for `full_rows`; it stays on this generation after the path is replaced
+        self._fd = os.open(path, os.O_RDONLY)
+        stat = os.fstat(self._fd)
+        self._mmap = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+        # identifies this generation; os.replace gives the next one a new inode
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+        self.header = _parse_header(self._mmap[:HEADER_SIZE])
+        if self.header is None:
+            raise ValueError(f"{path} is not a vector store")
+        self.dtype: str = self.header["dtype"]
+        self.dim: int = self.header["dim"]
+        self.count: int = self.header["count"]
+        self.generation: int = self.header["generation"]
+
+        buffer = memoryview(self._mmap)
+        sections = self.header["sections"]
+
+        def view(name: str, dtype, shape=None) -> np.ndarray | None:
+            offset, size = sections[name]
+            if not size and name == "scales":
+                return None
+            array = np.frombuffer(buffer, dtype=dtype, count=size // np.dtype(dtype).itemsize, offset=offset)
+            return array.reshape(shape) if shape else array
+
+        self.ids = view("ids", np.int64)
+        self.path_index = view("path_index", np.uint32)
+        self.scales = view("scales", np.float32)
+        self.vectors = view("vectors", DTYPES[self.dtype], (self.count, self.dim))
+        # float32 rows are read with pread rather than mapped: mapping them would fault in
+        # their neighbours too and grow every worker's resident set
+        self._full_offset, full_size = sections["full"]
+        self.has_full = full_size > 0
+        offset, size = sections["paths"]
+        self.paths = Paths(json.loads(bytes(buffer[offset:offset + size])), self.path_index)
+        offset, size = sections["texts"]
+        self.texts = Texts(buffer[offset:offset + size], view("text_offsets", np.uint64))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def row_of(self, chunk_id: int) -> int | None:
+        """Row of `chunk_id`; ids are stored in ascending order."""
+        row = int(np.searchsorted(self.ids, chunk_id))
+        return row if row < self.count and self.ids[row] == chunk_id else None
+
+    def full_rows(self, rows: np.ndarray) -> np.ndarray:
+        """The float32 vectors of `rows`, from the re-scoring section."""
+        size = self.dim * 4
+        data = b"".join(os.pread(self._fd, size, self._full_offset + int(row) * size) for row in rows)
+        return np.frombuffer(data, dtype=np.float32).reshape(len(rows), self.dim)
+
+    def __del__(self):
+        fd = getattr(self, "_fd", None)
+        if fd is not None:
+            os.close(fd)
+
+    def rows_for_paths(self, paths: Iterable[str]) -> np.ndarray:
+        paths = set(paths)
+        wanted = [i for i, path in enumerate(self.paths.table) if path in paths]
+        return np.flatnonzero(np.isin(self.path_index, wanted)).astype(np.int64)
+
+    def scorer(self):
+        if self.dtype == "float32":
+            return VectorScorer(self.vectors)
+        return QuantizedScorer(self)
+
+
+class QuantizedScorer:
+    """
+    Cosine top-k over a quantized store: every row (or the `rows` subset) is
+    scored from the compact matrix in blocks, then the best
+    `k * Config.Search.RESCORE_CANDIDATES` are scored again against their
+    float32 vectors. There is no ANN path: everything it reads is shared
+    between the processes mapping the store (see `Config.Search.FAISS_THRESHOLD`).
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        rescore: int = Config.Search.RESCORE_CANDIDATES,
+        block_rows: int = Config.Search.SCORE_BLOCK_ROWS,
+    ):
+        self.store = store
+        self.rescore = rescore if store.has_full else 0
+        self.block_rows = block_rows
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        """Approximate scores, converting one block at a time so the float32 copy stays small."""
+        vectors, scales = self.store.vectors, self.store.scales
+        total = len(vectors) if rows is None else len(rows)
+        scores = np.empty(total, dtype=np.float32)
+        # small enough to stay in cache between the conversion and the product
+        buffer = np.empty((min(self.block_rows, total), self.store.dim), dtype=np.float32)
+        for start in range(0, total, self.block_rows):
+            end = min(start + self.block_rows, total)
+            selection = slice(start, end) if rows is None else rows[start:end]
+            block = buffer[:end - start]
+            np.copyto(block, vectors[selection], casting="unsafe")
+            np.matmul(block, query, out=scores[start:end])
+        if scales is not None:
+            scores *= scales if rows is None else scales[rows]
+        return scores
+
+    def top_k(
+        self,
+        query: np.ndarray,
+        k: int,
+        min_score: float = -1.0,
+        rows: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return `(rows, scores)` of the `k` best matches, best first."""
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if k <= 0 or not len(self.store):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self._scores(query, rows)
+        candidates = min(len(scores), k * self.rescore if self.rescore else k)
+        if candidates < len(scores):
+            best = np.argpartition(-scores, candidates - 1)[:candidates]
+        else:
+            best = np.arange(len(scores))
+        found = best if rows is None else np.asarray(rows)[best]
+        if self.rescore:
+            # in file order, so the reads go forward through the section
+            found = np.sort(found)
+            scores = self.store.full_rows(found) @ query
+        else:
+            scores = scores[best]
+        keep = np.argsort(-scores, kind="stable")[:k]
+        keep = keep[scores[keep] >= min_score]
+        return found[keep].astype(np.int64), scores[keep].astype(np.float32)
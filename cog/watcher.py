@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+from cog.config import Config
+from cog.index import ChunkIndex
+
+logger = logging.getLogger(__name__)
+
+
+class IndexWatcher(FileSystemEventHandler):
+    """
+    Keeps a `ChunkIndex` hot by watching the data directory.
+    Create/modify/delete/move events are debounced, then only the affected
+    files are re-chunked and re-embedded on a background worker pool.
+    """
+
+    def __init__(
+        self,
+        index: ChunkIndex,
+        debounce: float = Config.Watcher.DEBOUNCE_SECONDS,
+        workers: int = Config.Watcher.WORKERS,
+    ):
+        self.index = index
+        self.debounce = debounce
+        self.workers = workers
+        self._pending: set[Path] = set()
+        self._in_flight: set[Path] = set()
+        self._full_scan = False
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self._observer = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._observer is not None and self._observer.is_alive()
+
+    def start(self):
+        """
+        Index the whole directory once, then follow changes. Does nothing when
+        another process is already the index's writer.
+        """
+        if self.running:
+            return
+        if not self.index.acquire_writer():
+            logger.info("Another process maintains the index; this one only reads it")
+            return
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="index")
+        self._observer = Observer()
+        self._observer.schedule(self, str(self.index.data_dir), recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        self._executor.submit(self._run, None)
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.index.release_writer()
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.event_type not in ("created", "modified", "deleted", "moved"):
+            return
+        with self._lock:
+            if event.is_directory:
+                # a moved or deleted directory takes its files with it
+                self._full_scan = self._full_scan or event.event_type in ("deleted", "moved")
+            else:
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path and os.path.splitext(path)[1] in Config.Search.SUFFIXES:
+                        self._pending.add(Path(os.fsdecode(path)))
+            self._schedule()
+
+    def _schedule(self):
+        """(Re)arm the debounce timer; callers hold `_lock`."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.debounce, self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            if self._executor is None:
+                return
+            if self._full_scan:
+                self._full_scan = False
+                self._pending.clear()
+                self._executor.submit(self._run, None)
+                return
+            # files still being indexed wait for the next round
+            ready = self._pending - self._in_flight
+            self._pending -= ready
+            self._in_flight |= ready
+            if self._pending:
+                self._schedule()
+            batches = [sorted(ready)[i::self.workers] for i in range(self.workers)]
+        for batch in batches:
+            if batch:
+                self._executor.submit(self._run, batch)
+
+    def _run(self, paths: list[Path] | None):
+        try:
+            updated = self.index.refresh(paths)
+            if updated:
+                logger.info("Re-indexed %d file(s)", updated)
+        except Exception:
+            logger.exception("Failed to update the search index")
+        finally:
+            if paths:
+                with self._lock:
+                    self._in_flight.difference_update(paths)
@@ -1,35 +1,69 @@
+import asyncio
+import fnmatch
+import json
+import logging
 import os
-import re
+import sys
 import textwrap
 import time
-from venv import create
-from cog.config import QWEN25_14B, Config
-from cog.models import create_llm
-from langchain import text_splitter
-import numpy as np
+from typing import TYPE_CHECKING, Literal
 
-from ollama import embeddings
-from pydantic import BaseModel, Field
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.embeddings import FastEmbedEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_experimental.text_splitter import SemanticChunker
 from mcp.server.fastmcp import FastMCP
-from cog.config import Config
-from sqlalchemy import all_
-from cog.config import embedding_config
-from cog.remote_embedder import RemoteOllamaEmbeddings
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
-import asyncio
+from pydantic import BaseModel, Field
+
+from cog import metrics
+from cog.concurrency import cached_factory, limit_concurrency
+from cog.config import QWEN25_14B, Config, embedding_config
+from cog.extractors import TextStore, extractor_for
+from cog.file_reader import iter_file, read_slice, resolve_data_path, slice_text
+from cog.file_stats import FileStatsCache
+from cog.lexical import reciprocal_rank_fusion
+from cog.models import KeepAlive, create_embeddings, create_llm
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+    from cog.embedding_cache import CachedEmbeddings
+    from cog.index import ChunkIndex
+    from cog.summarizer import Summarizer
+    from cog.watcher import IndexWatcher
+
+logger = logging.getLogger("server")
+
+# Heavy dependencies (numpy, langchain, model clients) load on first use, so
+# the server starts fast and tools like list_files never pay for them.
 
+@cached_factory
+def get_embedder() -> "CachedEmbeddings":
+    embedder = create_embeddings(embedding_config)
+    metrics.register_stats("embedding_cache", embedder.stats)
+    return embedder
+
+@cached_factory
+def get_text_store() -> TextStore:
+    """One extraction cache for the index, the summarizer and the file tools."""
+    texts = TextStore()
+    metrics.register_stats("text_store", texts.stats)
+    return texts
+
+@cached_factory
+def get_index() -> "ChunkIndex":
+    from cog.chunking import create_chunker
+    from cog.index import ChunkIndex
+
+    embedder = get_embedder()
+    return ChunkIndex(
+        embedder=embedder, chunker=create_chunker(Config.Chunking.STRATEGY, embedder), texts=get_text_store()
+    )
+
+@cached_factory
+def get_watcher() -> "IndexWatcher":
+    from cog.watcher import IndexWatcher
+
+    return IndexWatcher(get_index())
+
+file_stats = FileStatsCache(extract=lambda path: get_text_store().get(path))
 
-# Use the Config.Path.DATA_DIR from cog.config instead of defining a separate DATA_DIR
-embedder = RemoteOllamaEmbeddings(
-    endpoint=embedding_config.endpoint,
-    model=embedding_config.model
-)
 class DocumentChunk(BaseModel):
     document_path: str
     text: str
@@ -44,6 +78,23 @@ class File(BaseModel):
     line_count: int | None
     word_count: int | None
 
+class FileList(BaseModel):
+    files: list[File]
+    total: int = Field(..., description="Number of files matching the filters")
+    offset: int
+    next_offset: int | None = Field(None, description="Offset of the next page, if any")
+
+class FileSlice(BaseModel):
+    path: str
+    content: str
+    offset: int = Field(..., description="Byte offset of the first returned byte")
+    next_offset: int | None = Field(None, description="Byte offset to continue reading from, if truncated")
+    total_size: int
+    truncated: bool = Field(..., description="True when the size limit cut the requested range short")
+    eof: bool = Field(..., description="True when the slice reaches the end of the file")
+    start_line: int | None = None
+    end_line: int | None = None
+
 class SearchResult(BaseModel):
     content: str
     source: str
@@ -58,37 +109,132 @@ Please provide a concise summary in 3 sentences or lessof the following text:
 Summary:
 """).strip()
 
-summary_model = create_llm(QWEN25_14B)
+COMBINE_PROMPT = textwrap.dedent("""
+/no_think
+The following are summaries of consecutive parts of one document.
+Combine them into a single concise summary in 3 sentences or less:
+
+{text}
+
+Summary:
+""").strip()
+
+@cached_factory
+def get_summarizer() -> "Summarizer":
+    from cog.summarizer import Summarizer
+
+    return Summarizer(
+        create_llm(QWEN25_14B), QWEN25_14B.name, SUMMARIZE_PROMPT, COMBINE_PROMPT, texts=get_text_store()
+    )
+
+@cached_factory
+def get_keep_alive() -> KeepAlive:
+    """Keeps the summarization model loaded while the server runs, when Config.Models.KEEP_WARM is on."""
+    return KeepAlive(QWEN25_14B)
 
 mcp = FastMCP()
 
-app = FastAPI()
+@cached_factory
+def create_app() -> "FastAPI":
+    """
+    The HTTP side of the server; FastAPI is only imported when it is served.
+    The MCP tools are mounted at `/mcp`, so `/metrics` and `/events` report on
+    the same process that runs them.
+    """
+    from contextlib import asynccontextmanager
+
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import PlainTextResponse, StreamingResponse
+
+    mcp_app = mcp.streamable_http_app()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        get_watcher().start()
+        if Config.Models.KEEP_WARM:
+            get_keep_alive().start()
+        try:
+            async with mcp.session_manager.run():
+                yield
+        finally:
+            get_keep_alive().stop()
+            get_watcher().stop()
 
-@app.get("/events")
-async def sse_endpoint(request: Request):
-    async def event_generator():
-        while True:
-            if await request.is_disconnected():
-                break
-            yield f"data: Hello at {time.time()}\n\n"
-            await asyncio.sleep(1)
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        """Span latencies, batch sizes, token counts and cache statistics, in the Prometheus text format."""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/events")
+    async def sse_endpoint(request: Request):
+        """Live span and token events when Config.Metrics.EVENTS is on, a heartbeat otherwise."""
+        async def event_generator():
+            if not (Config.Metrics.ENABLED and Config.Metrics.EVENTS):
+                while not await request.is_disconnected():
+                    yield f"data: Hello at {time.time()}\n\n"
+                    await asyncio.sleep(1)
+                return
+            with metrics.subscription() as events:
+                while not await request.is_disconnected():
+                    try:
+                        event = await asyncio.wait_for(events.get(), Config.Metrics.HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": heartbeat\n\n"
+                        continue
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+    @app.get("/files/{path:path}")
+    async def stream_file(path: str, offset: int = 0, length: int | None = None):
+        """Stream a data file (or a byte range of it) in blocks instead of loading it whole."""
+        try:
+            full_path = resolve_data_path(path)
+        except PermissionError:
+            raise HTTPException(status_code=403, detail="Invalid path.")
+        if not full_path.is_file():
+            raise HTTPException(status_code=404, detail=f"File not found: {path}")
+        return StreamingResponse(iter_file(full_path, offset, length), media_type="text/plain; charset=utf-8")
+
+    # after the routes above, so they take precedence
+    app.mount("/", mcp_app)
+    return app
+
+def __getattr__(name: str):
+    # keeps `uvicorn server:app` working without importing FastAPI up front
+    if name == "app":
+        return create_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def _build_vector_store():
-    loader = DirectoryLoader(
-        str(Config.Path.DATA_DIR), glob="**/*.{txt,md,py,json}", loader_cls=TextLoader,
-        loader_kwargs={"encoding": "utf-8"}
-    )
-    docs = loader.load()
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_community.embeddings import FastEmbedEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    from cog.embedding_cache import CachedEmbeddings
+    from cog.index import iter_data_files
+
+    # Path.glob has no brace expansion, so "**/*.{txt,md,py,json}" never matched anything
+    texts = get_text_store().get_many([(path, None) for path in iter_data_files()])
+    docs = [Document(page_content=text, metadata={"source": str(path)}) for path, text in texts.items()]
     splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=100)
     chunks = splitter.split_documents(docs)
-    embeddings = FastEmbedEmbeddings()
+    embeddings = CachedEmbeddings(FastEmbedEmbeddings())
     return FAISS.from_documents(chunks, embeddings)
 
 @mcp.tool()
-def list_files() -> list[File]:
+@metrics.traced("tool.list_files")
+@limit_concurrency(Config.Server.Concurrency.LIST_FILES)
+async def list_files(
+    pattern: str = "*",
+    extensions: list[str] = [],
+    offset: int = 0,
+    limit: int = Config.Files.PAGE_SIZE,
+) -> FileList:
     """
-    List all files in the data directory with metadata.
+    List files in the data directory with metadata, one page at a time.
     File information includes:
     - path\n
     - size (in bytes)\n
@@ -97,150 +243,236 @@ def list_files() -> list[File]:
     - extension (file type)\n
     - line_count (number of lines, if applicable)\n
     - word_count (number of words, if applicable)\n
-    This tool scans the data directory and returns a list of File objects.   
+    `pattern` is a glob matched against the relative path (e.g. "notes/*.md"),
+    `extensions` keeps only the given extensions (e.g. [".py", ".md"]).
+    Files are sorted by path; use `offset`/`limit` and `next_offset` to page.
     """
-    files = []
+    return await asyncio.to_thread(_list_files, pattern, extensions, offset, limit)
+
+def _list_files(pattern: str, extensions: list[str], offset: int, limit: int) -> FileList:
+    # an empty or negative page would hand back a next_offset that never moves forward
+    offset = max(offset, 0)
+    limit = max(limit, 1)
+    suffixes = {ext if ext.startswith(".") else f".{ext}" for ext in extensions}
+    matches = []
     for root, _, fnames in os.walk(Config.Path.DATA_DIR):
         for fname in fnames:
-            fpath = os.path.join(root, fname)
-            relpath = os.path.relpath(fpath, Config.Path.DATA_DIR)
-            try:
-                stat = os.stat(fpath)
-                with open(fpath, "r", encoding="utf-8", errors="ignore") as f:
-                    content = f.read()
-                files.append(File(
-                    path=relpath, size=stat.st_size, modified_time=stat.st_mtime,
-                    created_time=stat.st_ctime, extension=os.path.splitext(fname)[1],
-                    line_count=len(content.splitlines()), word_count=len(content.split())
-                ))
-            except Exception: pass
-    return files
+            relpath = os.path.relpath(os.path.join(root, fname), Config.Path.DATA_DIR)
+            if suffixes and os.path.splitext(fname)[1] not in suffixes:
+                continue
+            if fnmatch.fnmatch(relpath, pattern):
+                matches.append(relpath)
+    matches.sort()
+    if pattern == "*" and not suffixes:
+        file_stats.prune({os.path.join(Config.Path.DATA_DIR, relpath) for relpath in matches})
+
+    # only the requested page is stat'ed and counted
+    page = []
+    for relpath in matches[offset:offset + limit]:
+        fpath = os.path.join(Config.Path.DATA_DIR, relpath)
+        try:
+            page.append((relpath, fpath, os.stat(fpath)))
+        except OSError:
+            pass
+    counts = file_stats.get_many([(fpath, stat) for _, fpath, stat in page])
+    files = [
+        File(
+            path=relpath, size=stat.st_size, modified_time=stat.st_mtime,
+            created_time=stat.st_ctime, extension=os.path.splitext(relpath)[1],
+            line_count=line_count, word_count=word_count
+        )
+        for (relpath, _, stat), (line_count, word_count) in zip(page, counts)
+    ]
+    next_offset = offset + limit
+    return FileList(
+        files=files, total=len(matches), offset=offset,
+        next_offset=next_offset if next_offset < len(matches) else None,
+    )
 
 @mcp.tool()
-def extract_text (file_path:str)-> str:
+@metrics.traced("tool.extract_text")
+@limit_concurrency(Config.Server.Concurrency.READ_FILE)
+async def extract_text (
+    file_path:str,
+    offset: int = 0,
+    length: int | None = None,
+    start_line: int | None = None,
+    end_line: int | None = None,
+)-> FileSlice | str:
     """
     Extract text from a file in the data directory.
-    This tool reads the content of a specified file and returns its text.
+    This tool reads the content of a specified file and returns its text:
+    PDF pages as plain text, JSON flattened to `key.path: value` lines and
+    Markdown without link targets.
+    Large files are returned one slice at a time, see read_file.
     """
-    return (Config.Path.DATA_DIR / file_path).read_text()
+    return await asyncio.to_thread(_read_file, file_path, offset, length, start_line, end_line, True)
 
 @mcp.tool()
-def summarize_file(file_path:str)-> str:
+@metrics.traced("tool.summarize_file")
+@limit_concurrency(Config.Server.Concurrency.SUMMARIZE_FILE)
+async def summarize_file(file_path:str)-> str:
     """
     Generate a concise summary of the specified file.
     This tool reads the content of a file and generates a summary in 3 sentences or less.
+    Large files are summarized part by part and the partial summaries combined.
     """
-    if not (Config.Path.DATA_DIR / file_path).exists():
+    try:
+        full_path = resolve_data_path(file_path)
+    except PermissionError:
+        return "Security alert: Invalid path."
+    if not full_path.is_file():
         return f"File not found: {file_path}"
-    
-    
-    file_content = (Config.Path.DATA_DIR/ file_path).read_text()
-    response = summary_model.invoke(SUMMARIZE_PROMPT.format(text=file_content))
-    content = response.content
-    if isinstance(content, list):
-        content = " ".join(str(item) for item in content)
-    else:
-        content = str(content)
-    return re.sub(r"<[^>]*>", "", content).strip()
+
+    # building the summarizer imports langchain_ollama and opens its cache; keep that off the event loop
+    summarizer = await asyncio.to_thread(get_summarizer)
+    return await summarizer.asummarize_file(full_path)
 
 @mcp.tool()
-def read_file(path: str = Field(...)) -> str:
-    full_path = os.path.abspath(os.path.join(Config.Path.DATA_DIR, path))
-    if not full_path.startswith(str(Config.Path.DATA_DIR)):
+@metrics.traced("tool.read_file")
+@limit_concurrency(Config.Server.Concurrency.READ_FILE)
+async def read_file(
+    path: str = Field(...),
+    offset: int = 0,
+    length: int | None = None,
+    start_line: int | None = None,
+    end_line: int | None = None,
+) -> FileSlice | str:
+    """
+    Read a file in the data directory, or a part of it.
+    Select bytes with `offset`/`length`, or 1-based inclusive lines with
+    `start_line`/`end_line`. At most Config.Files.MAX_READ_BYTES are returned
+    per call; only when `truncated` is true was the requested range cut
+    short, so continue from `next_offset`. `eof` tells whether the slice
+    reaches the end of the file.
+    """
+    return await asyncio.to_thread(_read_file, path, offset, length, start_line, end_line)
+
+def _read_file(path: str, offset: int, length: int | None,
+               start_line: int | None, end_line: int | None, extract: bool = False) -> FileSlice | str:
+    try:
+        full_path = resolve_data_path(path)
+    except PermissionError:
         return "Security alert: Invalid path."
+    extractor = extractor_for(full_path)
     try:
-        with open(full_path, "r", encoding="utf-8") as f:
-            return f.read()
+        # binary formats, and extract_text on formats that need parsing, read the extracted text
+        if extractor.binary or (extract and not extractor.raw):
+            view = slice_text(get_text_store().get(full_path), offset, length, start_line, end_line)
+        else:
+            view = read_slice(full_path, offset, length, start_line, end_line)
     except Exception as e:
+        logger.warning("Reading %s failed: %s", path, e)
         return f"Error reading file: {e}"
+    return FileSlice(
+        path=path, content=view.text, offset=view.offset,
+        next_offset=view.end if view.truncated else None,
+        total_size=view.total_size, truncated=view.truncated, eof=view.eof,
+        start_line=view.start_line, end_line=view.end_line,
+    )
+
+def _search_paths(file_paths: list[str]) -> list[str]:
+    """The requested files as index paths; anything outside the data directory or not searchable is dropped."""
+    root = Config.Path.DATA_DIR.resolve()
+    paths = []
+    for path in file_paths:
+        try:
+            full_path = resolve_data_path(path)
+        except PermissionError:
+            continue
+        if full_path.suffix in Config.Search.SUFFIXES:
+            paths.append(str(full_path.relative_to(root)))
+    return paths
 
 @mcp.tool()
-def search(query: str , file_paths: list[str]=[]) -> list[DocumentChunk]:
+@metrics.traced("tool.search")
+@limit_concurrency(Config.Server.Concurrency.SEARCH)
+async def search(
+    query: str,
+    file_paths: list[str] = [],
+    top_k: int = Config.Search.TOP_K,
+    min_score: float = Config.Search.MIN_SCORE,
+    mode: Literal["hybrid", "vector", "lexical"] = Config.Search.MODE,
+) -> list[DocumentChunk]:
     """
     Search for a query in the text files in the data directory.
-    Returns a list of DocumentChunk objects containing the text and relevancy score.
+    Returns at most `top_k` DocumentChunk objects, best first.
+    - "vector": semantic similarity; the score is the cosine similarity and
+      chunks below `min_score` are dropped.
+    - "lexical": BM25 keyword match, best for exact identifiers, file names and
+      code symbols; answers locally without calling the embedding server.
+    - "hybrid" (default): both rankings fused by reciprocal rank fusion.
     """
-    text_splitter = SemanticChunker(
-        embeddings=embedder,
-        breakpoint_threshold_type="percentile",
-        breakpoint_threshold_amount=95,
-    )
-    # get file to search
-    if file_paths:
-        # Search only specified files
-        files_to_search =[
-            Config.Path.DATA_DIR/ path
-            for path in file_paths if (Config.Path.DATA_DIR / path).exists()
-        ]
-    else:
-        # Search all text files in the data directory
-        files_to_search = [
-            f
-            for f in Config.Path.DATA_DIR.glob("**/*.{txt,md,py,json}")
+    # the first call imports numpy and langchain and opens the index; keep that off the event loop
+    index = await asyncio.to_thread(get_index)
+    watcher = await asyncio.to_thread(get_watcher)
+    # The watcher keeps the index hot; without it, only new or changed files get chunked and embedded here,
+    # and only in the process that writes the index (refresh returns at once in the others)
+    paths = _search_paths(file_paths) if file_paths else None
+    if paths == []:
+        return []
+    if not watcher.running:
+        with metrics.span("search.refresh"):
+            await asyncio.to_thread(index.refresh, [
+                Config.Path.DATA_DIR / path for path in paths if (Config.Path.DATA_DIR / path).exists()
+            ] if paths is not None else None)
+    # mapping a new generation (and building its scorer) is file I/O
+    snapshot = await asyncio.to_thread(index.snapshot)
+    if not len(snapshot.ids):
+        return []
+
+    # restrict scoring to the chunks of the requested files
+    rows = None
+    if paths is not None:
+        rows = snapshot.rows_for_paths(paths)
+        if not rows.size:
+            return []
+
+    candidates = top_k if mode != "hybrid" else top_k * Config.Search.HYBRID_CANDIDATES
+    ranked: list[tuple[int, float]] = []
+    if mode in ("lexical", "hybrid"):
+        chunk_ids = None if rows is None else set(snapshot.ids[rows].tolist())
+        with metrics.span("search.lexical"):
+            lexical_hits = await asyncio.to_thread(index.lexical_search, query, candidates, chunk_ids)
+        # chunks committed after this snapshot was published are skipped
+        ranked = [
+            (row, score) for chunk_id, score in lexical_hits
+            if (row := snapshot.row_of(chunk_id)) is not None
         ]
+    if mode in ("vector", "hybrid"):
+        # Only the query needs embedding; chunk vectors come from the index
+        with metrics.span("search.embed_query"):
+            query_embedding = await get_embedder().aembed_query(query)
+        with metrics.span("search.vector"):
+            found, scores = await asyncio.to_thread(
+                snapshot.scorer.top_k, query_embedding, candidates, min_score, rows=rows
+            )
+        vector_hits = [(int(row), float(score)) for row, score in zip(found, scores)]
+        if mode == "vector":
+            ranked = vector_hits
+        else:
+            ranked = reciprocal_rank_fusion(
+                [[row for row, _ in ranked], [row for row, _ in vector_hits]]
+            )
 
-    #collect all chunks with their source files
-    all_chunks = []
-    chunk_texts = []
-    
-    # Process each file
-    for file_path in files_to_search:
-        try:
-            # Read file content
-            file_content = file_path.read_text(encoding="utf-8", errors="ignore")
-            
-            # Create chunks using semantic chunker
-            chunks = text_splitter.create_documents([file_content])
-            
-            # Process each chunk
-            for chunk in chunks:
-                relative_path = str(file_path.relative_to(Config.Path.DATA_DIR))
-                all_chunks.append({
-                    "document_path": relative_path,
-                    "text": chunk.page_content,
-                })
-                chunk_texts.append(chunk.page_content)
-        except Exception as e:
-            print(f"Error processing file {file_path}: {e}")
-            continue
-    
-    # If no chunks were found, return empty list
-    if not all_chunks:
-        return []
-    
-    # Calculate relevancy scores using embeddings
-    query_embedding = embedder.embed_query(query)
-    chunk_embeddings = embedder.embed_documents(chunk_texts)
-    # similarities = np.dot(chunk_embeddings, query_embedding) 
-    # similarity_ind= np.argsort(similarities)[::-1]  
-
-
-    
-    # Calculate cosine similarity for relevancy scores
-    relevancy_scores = []
-    for chunk_embedding in chunk_embeddings:
-        # if similarity_ind.size <0.1:
-        #     continue
-        # Calculate cosine similarity between query and chunk
-        similarity = np.dot(query_embedding, chunk_embedding) / (
-            np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding)
+    return [
+        DocumentChunk(
+            document_path=snapshot.paths[row],
+            text=snapshot.texts[row],
+            relevancy_score=float(score),
         )
-        relevancy_scores.append(float(similarity))
-    
-    # Create DocumentChunk objects with relevancy scores
-    results = []
-    for idx, chunk_info in enumerate(all_chunks):
-        results.append(DocumentChunk(
-            document_path=chunk_info["document_path"],
-            text=chunk_info["text"],
-            relevancy_score=relevancy_scores[idx]
-        ))
-    
-    # Sort results by relevancy score (highest first)
-    results.sort(key=lambda x: x.relevancy_score, reverse=True)
-    
-    return results
+        for row, score in ranked[:top_k]
+    ]
 
 if __name__ == "__main__":
-    print("Running MCP server...")
-    mcp.run()
+    # stdout carries the MCP protocol when the agent spawns this server over stdio
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.info("Running MCP server...")
+    get_watcher().start()
+    if Config.Models.KEEP_WARM:
+        get_keep_alive().start()
+    try:
+        mcp.run()
+    finally:
+        get_keep_alive().stop()
+        get_watcher().stop()